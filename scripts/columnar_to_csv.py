@@ -0,0 +1,31 @@
+"""
+Exports columnar output tables (see `tol.output.columnar`) to CSV
+files in the regular output format. For every table directory given,
+a CSV file with the same name is written next to it.
+
+Usage: python columnar_to_csv.py output/fitness [output/summary ...]
+"""
+import os
+import sys
+from tol.output import ColumnarReader, is_columnar
+
+
+def export(directory):
+    directory = directory.rstrip(os.sep)
+    if not is_columnar(directory):
+        print("%s is not a columnar table, skipping." % directory)
+        return
+
+    reader = ColumnarReader(directory)
+    filename = directory + '.csv'
+    reader.to_csv(filename)
+    print("Exported %d rows to %s" % (len(reader), filename))
+
+
+if __name__ == '__main__':
+    if len(sys.argv) < 2:
+        print("Usage: %s TABLE_DIR [TABLE_DIR ...]" % sys.argv[0])
+        sys.exit(1)
+
+    for arg in sys.argv[1:]:
+        export(arg)
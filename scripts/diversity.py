@@ -1,7 +1,14 @@
 from zss import simple_distance
 from itertools import combinations
-from revolve.spec import Robot
 import sys
+import os
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__))+'/../')
+
+from tol.output import RobotLoader
+
+# Robot loader of each output directory
+loaders = {}
 
 class Node(object):
     def __init__(self, part=None, conn=None):
@@ -59,9 +66,10 @@ def process_list(cur, bots, robot_cache, pair_cache):
         if robot_id in robot_cache:
             proto_bots.append(robot_cache[robot_id])
         else:
-            bot = Robot()
-            with open(dir+'/robot_'+str(robot_id)+'.pb', 'rb') as f:
-                bot.ParseFromString(f.read())
+            if dir not in loaders:
+                loaders[dir] = RobotLoader(dir)
+
+            bot = loaders[dir].get(robot_id)
 
             bot_pair = robot_id, Node(bot.body.root)
             proto_bots.append(bot_pair)
@@ -148,19 +148,11 @@ def get_insert_position(conf, ra, rb, world):
         # Add some randomness to the insert position
         new_pos += 0.1 * pick_position(conf)
 
-        good = True
-        for r in world.robots.values():
-            if not r.last_position:
-                continue
-
-            # Only choose positions that are more than 25cm
-            # away from the nearest bot but closer than 4m
-            # from the furthest bot.
-            diff = r.last_position - new_pos
-            dist = diff.norm()
-            if dist < in_cm(25) or dist > 4:
-                good = False
-                break
+        # Only choose positions that are more than 25cm
+        # away from the nearest bot but closer than 4m
+        # from the furthest bot.
+        good = not world.robots_within(new_pos, in_cm(25)) and \
+            len(world.robots_within(new_pos, 4)) == len(world.positions)
 
     return new_pos
 
@@ -12,11 +12,12 @@ from __future__ import absolute_import
 import sys
 import time
 import os
-import shutil
 import random
-import csv
 import itertools
+import csv
 import logging
+import math
+import numpy as np
 import trollius
 from trollius import From, Return
 
@@ -27,16 +28,28 @@ from sdfbuilder.math import Vector3
 
 from revolve.util import wait_for
 
-from tol.manage.robot import Robot
+from tol.manage.robot import Robot, EvaluationRecord, optimistic_fitness
 from tol.config import parser
 from tol.manage import World
+from tol.manage.pool import EvaluationPool
+from tol.manage.fitness_cache import FitnessCache
+from tol.spec import get_body_spec
+from tol.output import CsvFiles
 from tol.logging import logger, output_console
-from tol.util.analyze import list_extremities, count_joints, count_motors, count_extremities, count_connections
+from tol.util.selection import select_pairs
+from tol.metrics import metrics
 
 # Log output to console
 output_console()
 logger.setLevel(logging.DEBUG)
 
+# Runtime metrics
+EVALUATIONS = metrics.counter('tol_evaluations_total', "Number of evaluated robots.")
+EVALUATION_TIME = metrics.histogram('tol_evaluation_seconds',
+                                    "Wall clock time of a single robot evaluation.",
+                                    buckets=(1.0, 2.5, 5.0, 7.5, 10.0, 15.0, 20.0, 30.0, 60.0))
+GENERATION = metrics.gauge('tol_generation', "Current generation.")
+
 # Add offline evolve arguments
 parser.add_argument(
     '--population-size',
@@ -98,7 +111,97 @@ parser.add_argument(
     default=10.0, type=float,
     help="Maximum number of seconds one evaluation can take before the "
          "decision is made to restart from snapshot. The assumption is "
-         "that the world may have become slow and restarting will help."
+         "that the world may have become slow and restarting will help. "
+         "When evaluating on workers, only the simulator of the slow worker "
+         "is restarted."
+)
+
+parser.add_argument(
+    '--steady-state',
+    default=False, type=str2bool,
+    help="Produce and evaluate a new child as soon as an evaluation slot is free,"
+         " rather than a whole generation at a time. Children replace the worst"
+         " individual with --keep-parents, or the oldest otherwise. The population"
+         " is logged every --num-children births, with the birth count in place"
+         " of the generation number. Only has a benefit with --num-workers, since"
+         " without a pool there is a single evaluation slot."
+)
+
+parser.add_argument(
+    '--racing',
+    default=False, type=str2bool,
+    help="Stop the evaluation of a robot early when even an optimistic estimate"
+         " of its final fitness is below that of the worst surviving individual."
+         " Only used with --keep-parents."
+)
+
+parser.add_argument(
+    '--racing-min-fraction',
+    default=0.5, type=float,
+    help="Fraction of the evaluation time after which evaluations may be stopped early."
+)
+
+parser.add_argument(
+    '--racing-speed-bound',
+    default=0.2, type=float,
+    help="Velocity in m/s a robot is optimistically assumed to reach over the"
+         " remainder of its evaluation when deciding whether to stop it early."
+)
+
+parser.add_argument(
+    '--fitness-cache',
+    default=False, type=str2bool,
+    help="Remember the speed of every evaluated genotype, so that known genotypes"
+         " do not have to be simulated again."
+)
+
+parser.add_argument(
+    '--reevaluation-probability',
+    default=0.0, type=float,
+    help="Probability with which a genotype known to the fitness cache is simulated"
+         " again, its cached speed is the average of all its evaluations."
+)
+
+parser.add_argument(
+    '--batch-evaluation',
+    default=False, type=str2bool,
+    help="Evaluate robots in batches, placed on a grid in the same world, rather"
+         " than one by one."
+)
+
+parser.add_argument(
+    '--batch-size',
+    default=0, type=int,
+    help="Number of robots per evaluation batch, 0 for a whole generation."
+)
+
+parser.add_argument(
+    '--grid-spacing',
+    default=5.0, type=float,
+    help="Distance in meters between the centers of the robots in a batch"
+         " evaluation. It is increased if it does not leave `--grid-clearance`"
+         " between the bounding boxes of the robots."
+)
+
+parser.add_argument(
+    '--grid-clearance',
+    default=2.0, type=float,
+    help="Minimum free space in meters between the bounding boxes of robots in"
+         " a batch evaluation."
+)
+
+parser.add_argument(
+    '--num-workers',
+    default=0, type=int,
+    help="Number of additional simulators robots are evaluated on in parallel."
+         " With 0, robots are evaluated one by one in the main simulator."
+)
+
+parser.add_argument(
+    '--worker-base-port',
+    default=11346, type=int,
+    help="Gazebo master port of the first worker simulator, the other workers"
+         " use consecutive ports."
 )
 
 
@@ -106,6 +209,9 @@ class OfflineEvoManager(World):
     """
     Extended world manager for the offline evolution script
     """
+    profiled_methods = World.profiled_methods + (
+        'evaluate_pair', 'evaluate_population', 'simulate_population', 'produce_generation',
+        'produce_child', 'log_generation')
 
     def __init__(self, conf, _private):
         """
@@ -120,35 +226,71 @@ class OfflineEvoManager(World):
 
         # Output files
         csvs = {
-            'generations': ['run', 'gen', 'robot_id', 'vel', 'dvel', 'fitness', 't_eval'],
+            'generations': ['run', 'gen', 'robot_id', 'vel', 'dvel', 'fitness', 't_eval',
+                            'evaluations', 'terminated', 'cache_size', 'cache_hits',
+                            'cache_misses', 'cache_reevaluations'],
             'robot_details': ['robot_id', 'extremity_id', 'extremity_size',
                               'joint_count', 'motor_count']
         }
-        self.csv_files = {k: {'filename': None, 'file': None, 'csv': None,
-                              'header': csvs[k]}
-                          for k in csvs}
+        if conf.fitness_cache:
+            csvs['fitness_cache'] = ['genotype', 'config', 'evaluations', 'vel', 'dvel']
 
-        self.current_run = 0
-
-        if self.output_directory:
-            for k in self.csv_files:
-                fname = os.path.join(self.output_directory, k + '.csv')
-                self.csv_files[k]['filename'] = fname
-                if self.do_restore:
-                    shutil.copy(fname + '.snapshot', fname)
-                    f = open(fname, 'ab', buffering=1)
-                else:
-                    f = open(fname, 'wb', buffering=1)
+        data = self.do_restore
+        self.csv_files = CsvFiles(self.output, self.output_directory, csvs,
+                                  restore=bool(data),
+                                  marks=data.get('csv_marks') if data else None)
 
-                self.csv_files[k]['file'] = f
-                self.csv_files[k]['csv'] = csv.writer(f, delimiter=',')
+        self.current_run = 0
 
-                if not self.do_restore:
-                    self.csv_files[k]['csv'].writerow(self.csv_files[k]['header'])
+        # Fitness a child has to exceed to survive, evaluations of
+        # children that cannot reach it are stopped early.
+        self.racing_cutoff = None
+
+        self.fitness_cache = None
+        if conf.fitness_cache:
+            self.fitness_cache = FitnessCache(conf, conf.reevaluation_probability,
+                                              state=data.get('fitness_cache') if data else None)
+
+            # Entries are restored from the cache file, which has been
+            # truncated to its size at the time of the snapshot. Snapshots
+            # taken without the cache do not have a mark for it.
+            marks = data.get('csv_marks') if data else None
+            cache_file = os.path.join(self.output_directory, 'fitness_cache.csv') \
+                if self.output_directory else None
+            if cache_file and marks and 'fitness_cache' in marks and os.path.exists(cache_file):
+                with open(cache_file, 'rb') as f:
+                    self.fitness_cache.load(row for row in csv.reader(f)
+                                            if row != csvs['fitness_cache'])
+
+        # Pool of simulators to evaluate robots on, started in `run`
+        self.pool = None
+        if conf.num_workers > 0:
+            world_file = os.path.join(os.path.dirname(os.path.abspath(__file__)), conf.world)
+            threshold = conf.evaluation_threshold
+            if conf.batch_evaluation:
+                threshold *= conf.batch_size or max(conf.population_size, conf.num_children)
+
+            self.pool = EvaluationPool(self, world_file, conf.num_workers, conf.worker_base_port,
+                                       slowdown_threshold=threshold)
 
     def robots_header(self):
         return Robot.header()
 
+    def create_robot_manager(self, robot_name, tree, robot, position, t, battery_level, parents):
+        """
+        Writes the extremity details of every robot once, when
+        its robot manager is created.
+        :return:
+        """
+        manager = super(OfflineEvoManager, self).create_robot_manager(
+            robot_name, tree, robot, position, t, battery_level, parents)
+
+        do = self.csv_files['robot_details']
+        if do:
+            do.writerows(manager.morphology.extremity_rows(robot.id))
+
+        return manager
+
     @classmethod
     @trollius.coroutine
     def create(cls, conf):
@@ -161,129 +303,503 @@ class OfflineEvoManager(World):
         yield From(self._init())
         raise Return(self)
 
-    @trollius.coroutine
-    def create_snapshot(self):
+    def register_evaluated(self, robot):
         """
-        Copy the generations file in the snapshot
+        Writes the output of a robot that was evaluated by a pool
+        worker, which itself has no output directory, or that was not
+        simulated because its genotype is known to the fitness cache.
+        :param robot:
+        :type robot: Robot|EvaluationRecord
         :return:
         """
-        ret = yield From(super(OfflineEvoManager, self).create_snapshot())
-        if not ret:
-            raise Return(ret)
+        if not self.output_directory:
+            return
+
+        robot.write_robot(self, os.path.join(self.output_directory, 'robot_%d.pb' % robot.robot.id),
+                          self.write_robots)
 
-        for k in self.csv_files:
-            entry = self.csv_files[k]
-            if entry['file']:
-                entry['file'].flush()
-                shutil.copy(entry['filename'], entry['filename'] + '.snapshot')
+        do = self.csv_files['robot_details']
+        if do:
+            do.writerows(robot.morphology.extremity_rows(robot.robot.id))
+
+    def population_state(self, pairs):
+        """
+        :param pairs: List of (robot, evaluation wallclock time) tuples
+        :return: Compact state of the population for a snapshot, which
+                 does not include the robots' speed windows.
+        """
+        return [(EvaluationRecord.from_robot(robot).state(), t_eval) for robot, t_eval in pairs]
+
+    def restore_population(self, data):
+        """
+        :param data: Snapshot data
+        :return: The population in the snapshot as a list of
+                 (robot, evaluation wallclock time) tuples.
+        """
+        if 'population' not in data:
+            # Snapshot of the full robot objects
+            return data['local_pairs']
+
+        body_spec = get_body_spec(self.conf)
+        return [(EvaluationRecord.from_state(self.conf, state, body_spec), t_eval)
+                for state, t_eval in data['population']]
 
     @trollius.coroutine
     def get_snapshot_data(self):
         """
+        The snapshot holds the compact population state, the fitness cache
+        counters and the sizes of the output files, so its size does not
+        depend on how long the experiment has been running. The fitness
+        cache entries themselves are in `fitness_cache.csv`.
         :return:
         """
         data = yield From(super(OfflineEvoManager, self).get_snapshot_data())
         data.update(self._snapshot_data)
+        if self.fitness_cache:
+            data['fitness_cache'] = self.fitness_cache.state()
+        data['csv_marks'] = self.csv_files.snapshot()
         raise Return(data)
 
     @trollius.coroutine
-    def evaluate_pair(self, tree, bbox, parents=None):
+    def evaluate_pair(self, tree, bbox, parents=None, world=None):
         """
         Evaluates a single robot tree.
         :param tree:
         :param bbox:
         :param parents:
+        :param world: World to evaluate the robot in, defaults to this world.
+                      Slowdown of other worlds is handled by the evaluation pool.
         :return: Evaluated Robot object
         """
+        world = world or self
+
         # Pause the world just in case it wasn't already
-        yield From(wait_for(self.pause(True)))
+        yield From(wait_for(world.pause(True)))
 
         pose = Pose(position=Vector3(0, 0, -bbox.min.z))
-        fut = yield From(self.insert_robot(tree, pose, parents=parents))
+        fut = yield From(world.insert_robot(tree, pose, parents=parents))
         robot = yield From(fut)
 
         max_age = self.conf.evaluation_time + self.conf.warmup_time
 
         # Unpause the world to start evaluation
-        yield From(wait_for(self.pause(False)))
+        yield From(wait_for(world.pause(False)))
 
         before = time.time()
 
         while True:
-            if robot.age() >= max_age:
+            age = robot.age()
+            if age >= max_age:
+                break
+
+            if self.lost_race(robot, age):
+                robot.terminated = True
                 break
 
             # Sleep for the pose update frequency, which is about when
             # we expect a new age update.
-            yield From(trollius.sleep(1.0 / self.state_update_frequency))
+            yield From(trollius.sleep(1.0 / world.state_update_frequency))
 
-        yield From(wait_for(self.delete_robot(robot)))
-        yield From(wait_for(self.pause(True)))
+        yield From(wait_for(world.delete_robot(robot)))
+        yield From(wait_for(world.pause(True)))
 
         diff = time.time() - before
-        if diff > self.conf.evaluation_threshold:
+        if world is self and diff > self.conf.evaluation_threshold:
             sys.stderr.write("Evaluation threshold exceeded, shutting down with nonzero status code.\n")
             sys.stderr.flush()
             sys.exit(15)
 
         raise Return(robot)
 
+    def lost_race(self, robot, age):
+        """
+        :param robot:
+        :param age: Current age of the robot
+        :return: Whether the evaluation of the robot can be stopped
+                 because it is not expected to reach the racing cutoff.
+        """
+        conf = self.conf
+        cutoff = self.racing_cutoff
+        if cutoff is None or age < conf.warmup_time + conf.racing_min_fraction * conf.evaluation_time:
+            return False
+
+        return optimistic_fitness(
+            conf, robot.size, robot.velocity(), robot.displacement_velocity(),
+            float(age) - conf.warmup_time, conf.racing_speed_bound) < cutoff
+
+    def grid_positions(self, bboxes):
+        """
+        Places robots with the given bounding boxes on a square grid
+        around the origin, with the bounding boxes centered on the
+        grid points and resting on the ground.
+        :param bboxes:
+        :return: List of positions
+        :rtype: list[Vector3]
+        """
+        # Largest footprint diagonal of the batch, so no two bounding
+        # boxes come closer than the clearance in any orientation.
+        extent = max(math.sqrt((b.max.x - b.min.x) ** 2 + (b.max.y - b.min.y) ** 2)
+                     for b in bboxes)
+        spacing = self.conf.grid_spacing
+        min_spacing = extent + self.conf.grid_clearance
+        if spacing < min_spacing:
+            logger.warning("Grid spacing %.2f is too small for robots of size %.2f, using %.2f."
+                           % (spacing, extent, min_spacing))
+            spacing = min_spacing
+
+        side = int(math.ceil(math.sqrt(len(bboxes))))
+        offset = 0.5 * (side - 1) * spacing
+        positions = []
+        for i, b in enumerate(bboxes):
+            row, col = divmod(i, side)
+            positions.append(Vector3(col * spacing - offset - 0.5 * (b.min.x + b.max.x),
+                                     row * spacing - offset - 0.5 * (b.min.y + b.max.y),
+                                     -b.min.z))
+
+        return positions
+
+    @trollius.coroutine
+    def evaluate_batch(self, trees, bboxes, parents, world=None):
+        """
+        Evaluates a batch of robot trees simultaneously, placed on a
+        grid. Each robot's fitness comes from its own speed window.
+        Robots that lose the race are removed from the world while
+        the rest of the batch continues.
+        :param trees:
+        :param bboxes:
+        :param parents:
+        :param world: World to evaluate the robots in, defaults to this world.
+        :return: List of evaluated Robot objects
+        """
+        world = world or self
+        yield From(wait_for(world.pause(True)))
+
+        futures = []
+        for tree, pos, par in itertools.izip(trees, self.grid_positions(bboxes), parents):
+            fut = yield From(world.requests.submit(
+                'insert_robot', lambda t=tree, p=pos, par=par: world.insert_robot(
+                    t, Pose(position=p), parents=par), retries=0))
+            futures.append(fut)
+
+        robots = []
+        for fut in futures:
+            robot = yield From(fut)
+            robots.append(robot)
+
+        max_age = self.conf.evaluation_time + self.conf.warmup_time
+        yield From(wait_for(world.pause(False)))
+        before = time.time()
+
+        running = robots
+        while running:
+            terminated = []
+            for robot in running:
+                age = robot.age()
+                if age < max_age and self.lost_race(robot, age):
+                    robot.terminated = True
+                    terminated.append(robot)
+
+            if terminated:
+                yield From(wait_for(world.delete_robots(terminated)))
+
+            running = [r for r in running if not r.terminated and r.age() < max_age]
+            if running:
+                yield From(trollius.sleep(1.0 / world.state_update_frequency))
+
+        yield From(wait_for(world.pause(True)))
+        yield From(wait_for(world.delete_robots([r for r in robots if not r.terminated])))
+
+        # Allow the same wall clock time per robot as a single evaluation
+        diff = time.time() - before
+        if world is self and diff > self.conf.evaluation_threshold * len(robots):
+            sys.stderr.write("Evaluation threshold exceeded, shutting down with nonzero status code.\n")
+            sys.stderr.flush()
+            sys.exit(15)
+
+        raise Return(robots)
+
+    @trollius.coroutine
+    def evaluate_batches(self, trees, bboxes, parents):
+        """
+        Evaluates a population in batches, on the evaluation
+        pool if there is one.
+        :param trees:
+        :param bboxes:
+        :param parents:
+        :return: List of (robot, evaluation wallclock time) tuples, where
+                 each robot is attributed an equal share of its batch's time.
+        """
+        n = self.conf.batch_size or len(trees)
+        batches = [(trees[i:i + n], bboxes[i:i + n], parents[i:i + n])
+                   for i in xrange(0, len(trees), n)]
+
+        if self.pool:
+            results = yield From(self.pool.map(
+                lambda world, *batch: self.evaluate_batch(*batch, world=world), batches))
+        else:
+            results = []
+            for batch in batches:
+                before = time.time()
+                robots = yield From(self.evaluate_batch(*batch))
+                results.append((robots, time.time() - before))
+
+        pairs = [(robot, t_eval / len(robots)) for robots, t_eval in results for robot in robots]
+        if self.pool:
+            for robot, _ in pairs:
+                self.register_evaluated(robot)
+
+        raise Return(pairs)
+
     @trollius.coroutine
     def evaluate_population(self, trees, bboxes, parents=None):
         """
+        Evaluates a population, skipping the simulation of
+        genotypes that are known to the fitness cache.
         :param trees:
         :param bboxes:
         :param parents:
-        :return:
+        :return: List of (robot, evaluation wallclock time) tuples
         """
         if parents is None:
             parents = [None for _ in trees]
 
+        cache = self.fitness_cache
+        if not cache:
+            pairs = yield From(self.simulate_population(trees, bboxes, parents))
+            raise Return(pairs)
+
+        keys = [cache.key(tree) for tree in trees]
+        entries = [cache.lookup(key) for key in keys]
+        simulate = [i for i, entry in enumerate(entries) if entry is None]
+        print("%d of %d robots known to the fitness cache." % (len(trees) - len(simulate), len(trees)))
+
+        simulated = yield From(self.simulate_population([trees[i] for i in simulate],
+                                                        [bboxes[i] for i in simulate],
+                                                        [parents[i] for i in simulate]))
+        pairs = [None] * len(trees)
+        for i, (robot, t_eval) in itertools.izip(simulate, simulated):
+            if robot.terminated:
+                # Partial statistics are not representative of the genotype
+                pairs[i] = (robot, t_eval)
+                continue
+
+            entry = cache.put(keys[i], robot.velocity(), robot.displacement_velocity())
+            if self.csv_files['fitness_cache']:
+                self.csv_files['fitness_cache'].writerow(cache.row(keys[i], entry))
+
+            n, velocity, dvel = entry
+            if n > 1:
+                robot = EvaluationRecord(self.conf, trees[i], robot.robot, velocity, dvel,
+                                         parents=parents[i], evaluations=n)
+
+            pairs[i] = (robot, t_eval)
+
+        for i, entry in enumerate(entries):
+            if entry is None:
+                continue
+
+            n, velocity, dvel = entry
+            record = EvaluationRecord(self.conf, trees[i], trees[i].to_robot(self.get_robot_id()),
+                                      velocity, dvel, parents=parents[i], evaluations=n)
+            self.register_evaluated(record)
+            pairs[i] = (record, 0.0)
+
+        raise Return(pairs)
+
+    @trollius.coroutine
+    def simulate_population(self, trees, bboxes, parents):
+        """
+        :param trees:
+        :param bboxes:
+        :param parents:
+        :return: List of (robot, evaluation wallclock time) tuples
+        """
+        if not trees:
+            raise Return([])
+
+        if self.conf.batch_evaluation:
+            print("Evaluating population in batches...")
+            pairs = yield From(self.evaluate_batches(trees, bboxes, parents))
+            EVALUATIONS.inc(len(pairs))
+            for _, t_eval in pairs:
+                EVALUATION_TIME.observe(t_eval)
+
+            print("Done evaluating population.")
+            raise Return(pairs)
+
+        if self.pool:
+            print("Evaluating population on %d workers..." % len(self.pool.workers))
+            pairs = yield From(self.pool.map(
+                lambda world, *item: self.evaluate_pair(*item, world=world),
+                zip(trees, bboxes, parents)))
+
+            for robot, t_eval in pairs:
+                self.register_evaluated(robot)
+                EVALUATIONS.inc()
+                EVALUATION_TIME.observe(t_eval)
+
+            print("Done evaluating population.")
+            raise Return(pairs)
+
         pairs = []
         print("Evaluating population...")
         for tree, bbox, par in itertools.izip(trees, bboxes, parents):
             print("Evaluating individual...")
             before = time.time()
             robot = yield From(self.evaluate_pair(tree, bbox, par))
-            pairs.append((robot, time.time() - before))
+            t_eval = time.time() - before
+            pairs.append((robot, t_eval))
+            EVALUATIONS.inc()
+            EVALUATION_TIME.observe(t_eval)
             print("Done.")
 
         print("Done evaluating population.")
         raise Return(pairs)
 
     @trollius.coroutine
-    def produce_generation(self, parents):
+    def produce_generation(self, parents, num_children=None):
         """
         Produce the next generation of robots from
         the current.
         :param parents:
+        :param num_children: Number of children, defaults to `num_children` from the config
         :return:
         """
+        num_children = num_children or self.conf.num_children
         print("Producing generation...")
         trees = []
         bboxes = []
         parent_pairs = []
 
-        while len(trees) < self.conf.num_children:
+        # Parent pairs are selected in batches, a tournament size
+        # of one comes down to random selection.
+        fitness = np.array([p.fitness() for p in parents])
+        tournament_size = 1 if self.conf.disable_selection else self.conf.tournament_size
+        selected = []
+
+        while len(trees) < num_children:
             print("Producing individual...")
-            if self.conf.disable_selection:
-                p1, p2 = random.sample(parents, 2)
-            else:
-                p1, p2 = select_parents(parents, self.conf)
-
-            for j in xrange(self.conf.max_mating_attempts):
-                pair = yield From(self.attempt_mate(p1, p2))
-                if pair:
-                    trees.append(pair[0])
-                    bboxes.append(pair[1])
-                    parent_pairs.append((p1, p2))
-                    break
+            if not selected:
+                selected = list(select_pairs(fitness, tournament_size,
+                                             num_children - len(trees)))
+
+            i, j = selected.pop()
+            p1, p2 = parents[i], parents[j]
+
+            pair = yield From(self.mate(p1, p2))
+            if pair:
+                trees.append(pair[0])
+                bboxes.append(pair[1])
+                parent_pairs.append((p1, p2))
 
             print("Done.")
 
         print("Done producing generation.")
         raise Return(trees, bboxes, parent_pairs)
 
+    def update_racing_cutoff(self, pairs):
+        """
+        Sets the fitness children have to exceed to survive in the given
+        population, which is the fitness of its `population_size`-th best
+        individual. Racing only applies to the plus strategy, where
+        children compete with the current population.
+        :param pairs:
+        :return:
+        """
+        conf = self.conf
+        if not conf.racing or not conf.keep_parents or conf.disable_fitness \
+                or len(pairs) < conf.population_size:
+            self.racing_cutoff = None
+            return
+
+        fitness = sorted((p[0].fitness() for p in pairs), reverse=True)
+        self.racing_cutoff = fitness[conf.population_size - 1]
+
+    @trollius.coroutine
+    def produce_child(self, pairs):
+        """
+        Produces and evaluates a single child of the
+        current population.
+        :param pairs: Current population as (robot, evaluation wallclock time) tuples
+        :return: The (robot, evaluation wallclock time) tuple of the child
+        """
+        if self.conf.disable_evolution:
+            trees, bboxes = yield From(self.generate_population(1))
+            parent_pairs = None
+        else:
+            trees, bboxes, parent_pairs = yield From(self.produce_generation([p[0] for p in pairs], 1))
+
+        child_pairs = yield From(self.evaluate_population(trees, bboxes, parent_pairs))
+        raise Return(child_pairs[0])
+
+    def replace(self, pairs, child):
+        """
+        Adds a child to the population in place. With `keep_parents`
+        the child replaces the worst individual (plus strategy),
+        otherwise it replaces the oldest (comma strategy).
+        :param pairs: Population as (robot, evaluation wallclock time) tuples,
+                      oldest first.
+        :param child:
+        :return:
+        """
+        pairs.append(child)
+        if len(pairs) <= self.conf.population_size:
+            return
+
+        if not self.conf.keep_parents:
+            del pairs[0]
+        elif self.conf.disable_fitness:
+            del pairs[random.randrange(len(pairs))]
+        else:
+            del pairs[min(xrange(len(pairs)), key=lambda i: pairs[i][0].fitness())]
+
+    @trollius.coroutine
+    def run_steady_state(self, evo, pairs, births):
+        """
+        Steady state evolution: a new child is produced every time an
+        evaluation slot frees up, until as many children have been born
+        as in `num_generations` generations. The population is logged
+        every `num_children` births.
+        :param evo: The evolution run
+        :param pairs: Initial population
+        :param births: Number of children born before
+        :return:
+        """
+        conf = self.conf
+        total = conf.num_children * (conf.num_generations - 1)
+        slots = len(self.pool.workers) if self.pool else 1
+        snapshot_interval = 10 * conf.num_children
+        pending = set()
+        self.update_racing_cutoff(pairs)
+
+        try:
+            while births + len(pending) < total or pending:
+                while len(pending) < slots and births + len(pending) < total:
+                    pending.add(trollius.Task(self.produce_child(list(pairs))))
+
+                done, pending = yield From(trollius.wait(pending, return_when=trollius.FIRST_COMPLETED))
+                for task in done:
+                    births += 1
+                    self.replace(pairs, task.result())
+                    self.update_racing_cutoff(pairs)
+                    if births % conf.num_children == 0:
+                        self.log_generation(evo, births, pairs)
+
+                    if births % snapshot_interval == 0:
+                        self._snapshot_data = {
+                            "population": self.population_state(pairs),
+                            "gen_start": 1,
+                            "births": births,
+                            "evo_start": evo
+                        }
+                        yield From(self.create_snapshot())
+                        print("Created snapshot of experiment state.")
+        finally:
+            # Stop the children that are still being produced when an
+            # evaluation failed, rather than leaving them running.
+            for task in pending:
+                task.cancel()
+
     def log_generation(self, evo, generation, pairs):
         """
         :param evo: The evolution run
@@ -292,24 +808,19 @@ class OfflineEvoManager(World):
         :return:
         """
         print("================== GENERATION %d ==================" % generation)
+        GENERATION.set(generation)
         if not self.output_directory:
             return
 
-        go = self.csv_files['generations']['csv']
-        do = self.csv_files['robot_details']['csv']
+        cache = self.fitness_cache
+        stats = [len(cache), cache.hits, cache.misses, cache.reevaluations] if cache else ['', '', '', '']
+
+        go = self.csv_files['generations']
         for robot, t_eval in pairs:
-            robot_id = robot.robot.id
-            root = robot.tree.root
             go.writerow([evo, generation, robot.robot.id, robot.velocity(),
-                         robot.displacement_velocity(), robot.fitness(), t_eval])
-
-            # TODO Write this once when robot is written instead
-            counter = 0
-            for extr in list_extremities(root):
-                num_joints = count_joints(extr)
-                num_motors = count_motors(extr)
-                do.writerow((robot_id, counter, len(extr), num_joints, num_motors))
-                counter += 1
+                         robot.displacement_velocity(), robot.fitness(), t_eval,
+                         getattr(robot, 'evaluations', 1),
+                         int(getattr(robot, 'terminated', False))] + stats)
 
     @trollius.coroutine
     def run(self):
@@ -318,16 +829,21 @@ class OfflineEvoManager(World):
         """
         conf = self.conf
 
+        if self.pool:
+            yield From(self.pool.start())
+
         if self.do_restore:
             # Recover from a previously cancelled / crashed experiment
             data = self.do_restore
             evo_start = data['evo_start']
             gen_start = data['gen_start']
-            pairs = data['local_pairs']
+            births = data.get('births', 0)
+            pairs = self.restore_population(data)
         else:
             # Start at the first experiment
             evo_start = 1
             gen_start = 1
+            births = 0
             pairs = None
 
         for evo in range(evo_start, conf.num_evolutions + 1):
@@ -336,15 +852,22 @@ class OfflineEvoManager(World):
             if not pairs:
                 # Only create initial population if we are not restoring from
                 # a previous experiment.
+                self.racing_cutoff = None
                 trees, bboxes = yield From(self.generate_population(conf.population_size))
                 pairs = yield From(self.evaluate_population(trees, bboxes))
                 self.log_generation(evo, 0, pairs)
 
+            if conf.steady_state:
+                yield From(self.run_steady_state(evo, pairs, births))
+                births = 0
+                pairs = None
+                continue
+
             for generation in xrange(gen_start, conf.num_generations):
                 if (generation % 10) == 0:
                     # Snapshot every 10 generations
                     self._snapshot_data = {
-                        "local_pairs": pairs,
+                        "population": self.population_state(pairs),
                         "gen_start": generation,
                         "evo_start": evo
                     }
@@ -360,6 +883,7 @@ class OfflineEvoManager(World):
                 else:
                     child_trees, child_bboxes, parent_pairs = yield From(self.produce_generation(robots))
 
+                self.update_racing_cutoff(pairs)
                 child_pairs = yield From(self.evaluate_population(child_trees, child_bboxes, parent_pairs))
 
                 if conf.keep_parents:
@@ -387,31 +911,11 @@ class OfflineEvoManager(World):
         """
         :return:
         """
-        yield From(super(OfflineEvoManager, self).teardown())
-        for k in self.csv_files:
-            if self.csv_files[k]['file']:
-                self.csv_files[k]['file'].close()
+        if self.pool:
+            yield From(self.pool.stop())
 
-
-def select_parent(parents, conf):
-    """
-    Select a parent using a binary tournament.
-    :param parents:
-    :param conf: Configuration object
-    :return:
-    """
-    return sorted(random.sample(parents, conf.tournament_size), key=lambda r: r.fitness())[-1]
-
-
-def select_parents(parents, conf):
-    """
-    :param parents:
-    :param conf: Configuration object
-    :return:
-    """
-    p1 = select_parent(parents, conf)
-    p2 = select_parent(list(parent for parent in parents if parent != p1), conf)
-    return p1, p2
+        self.csv_files.close()
+        yield From(super(OfflineEvoManager, self).teardown())
 
 
 @trollius.coroutine
@@ -421,6 +925,7 @@ def run():
     """
     conf = parser.parse_args()
     world = yield From(OfflineEvoManager.create(conf))
+    world.register_metrics()
     yield From(world.run())
 
 
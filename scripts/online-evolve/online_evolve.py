@@ -6,7 +6,6 @@ Online evolution experiment. Initially we try to answer the following questions:
 - How can we make the system stable? Depending on # of babies,
   initial / max population size, age of death.
 """
-import csv
 import logging
 import sys
 import math
@@ -19,7 +18,6 @@ from sdfbuilder import Pose
 from sdfbuilder.math import Vector3
 
 import os
-import shutil
 import trollius
 from trollius import From, Return
 from revolve.util import multi_future, wait_for, Time
@@ -27,15 +25,25 @@ from revolve.util import multi_future, wait_for, Time
 # ToL imports may require the system path
 sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..'))
 
-from tol.manage.robot import Robot
 from tol.config import parser
+from tol.config.config import str_to_bool
 from tol.manage import World
+from tol.output import CsvFiles
+from tol.util.selection import select_pairs
 from tol.logging import logger, output_console
+from tol.metrics import metrics
 
 # Output to console and enable debug logging
 output_console()
 logger.setLevel(logging.DEBUG)
 
+# Runtime metrics
+BIRTHS = metrics.counter('tol_births_total', "Number of robots born.")
+DEATHS = metrics.counter('tol_deaths_total', "Number of robots killed.")
+BIRTH_RATE = metrics.gauge('tol_births_per_sim_minute', "Births per simulation minute.")
+DEATH_RATE = metrics.gauge('tol_deaths_per_sim_minute', "Deaths per simulation minute.")
+INSERT_QUEUE = metrics.gauge('tol_insert_queue_length', "Number of robots waiting to be inserted.")
+
 # Environment parameters
 parser.add_argument(
     '--world-diameter',
@@ -55,6 +63,12 @@ parser.add_argument(
     help="The diameter of the birth clinic in meters."
 )
 
+parser.add_argument(
+    '--build-birth-clinic',
+    default=False, type=str_to_bool,
+    help="Add a birth clinic model to the arena."
+)
+
 parser.add_argument(
     '--drop-height',
     default=0.25, type=float,
@@ -136,6 +150,8 @@ class OnlineEvoManager(World):
     """
     World manager extended with capabilities for online evolution.
     """
+    profiled_methods = World.profiled_methods + (
+        'produce_individual', 'birth', 'kill_robots', 'log_fitness', 'log_summary')
 
     def __init__(self, conf, _private):
         """
@@ -154,9 +170,6 @@ class OnlineEvoManager(World):
                         'births', 'deaths'],
             'deaths': ['run', 'world_age', 'robot_id', 'x', 'y', 'z']
         }
-        self.csv_files = {k: {'filename': None, 'file': None, 'csv': None,
-                              'header': csvs[k]}
-                          for k in csvs}
 
         self._running = False
         data = self.do_restore
@@ -170,21 +183,16 @@ class OnlineEvoManager(World):
             self.births = 0
             self.deaths = 0
 
-        if self.output_directory:
-            for k in self.csv_files:
-                fname = os.path.join(self.output_directory, k+'.csv')
-                self.csv_files[k]['filename'] = fname
-                if self.do_restore:
-                    shutil.copy(fname + '.snapshot', fname)
-                    f = open(fname, 'ab', buffering=1)
-                else:
-                    f = open(fname, 'wb', buffering=1)
-
-                self.csv_files[k]['file'] = f
-                self.csv_files[k]['csv'] = csv.writer(f, delimiter=',')
-
-                if not self.do_restore:
-                    self.csv_files[k]['csv'].writerow(self.csv_files[k]['header'])
+        dtypes = {
+            'fitness': ['i4', 'f8', 'i4', 'i4', 'f8', 'f8', 'f8', 'f8', 'f8'],
+            'summary': ['i4', 'f8', 'i4', 'f8', 'i4', 'i4'],
+            'deaths': ['i4', 'f8', 'i4', 'f8', 'f8', 'f8']
+        }
+        self.csv_files = CsvFiles(self.output, self.output_directory, csvs,
+                                  restore=bool(self.do_restore),
+                                  marks=data.get('csv_marks') if data else None, dtypes=dtypes,
+                                  columnar=conf.columnar_output,
+                                  chunk_size=conf.columnar_chunk_size)
 
     @classmethod
     @trollius.coroutine
@@ -204,12 +212,9 @@ class OnlineEvoManager(World):
 
         :return:
         """
+        self.csv_files.close()
         yield From(super(OnlineEvoManager, self).teardown())
 
-        for k in self.csv_files:
-            if self.csv_files[k]['file']:
-                self.csv_files[k]['file'].close()
-
     @trollius.coroutine
     def get_snapshot_data(self):
         """
@@ -222,26 +227,11 @@ class OnlineEvoManager(World):
             'current_run': self.current_run,
             'births': self.births,
             'deaths': self.deaths,
-            'running': self._running
+            'running': self._running,
+            'csv_marks': self.csv_files.snapshot()
         })
         raise Return(data)
 
-    @trollius.coroutine
-    def create_snapshot(self):
-        """
-        Copy the fitness file in the snapshot
-        :return:
-        """
-        ret = yield From(super(OnlineEvoManager, self).create_snapshot())
-        if not ret:
-            raise Return(ret)
-
-        for k in self.csv_files:
-            entry = self.csv_files[k]
-            if entry['file']:
-                entry['file'].flush()
-                shutil.copy(entry['filename'], entry['filename'] + '.snapshot')
-
     @trollius.coroutine
     def build_arena(self):
         """
@@ -251,32 +241,23 @@ class OnlineEvoManager(World):
         logger.debug("Building the arena...")
         n = self.conf.num_wall_segments
 
-        futs = []
         r = self.conf.world_diameter * 0.5
         frac = 2 * math.pi / n
         points = [Vector3(r * math.cos(i * frac), r * math.sin(i * frac), 0) for i in range(n)]
-        fut = yield From(self.build_walls(points))
-        futs.append(fut)
-        raise Return(multi_future(futs))
-
-    def select_parent(self, parents):
-        """
-
-        :return:
-        """
-        return sorted(random.sample(parents, self.conf.tournament_size),
-                      key=lambda r: r.fitness())[-1]
+        clinic = self.conf.birth_clinic_diameter if self.conf.build_birth_clinic else None
+        fut = yield From(self.insert_arena(points, birth_clinic_diameter=clinic))
+        raise Return(fut)
 
     def select_parents(self):
         """
-        Returns a list of robots that have at least one potential mate.
+        Selects two distinct parents from the evaluated robots
+        using tournament selection.
 
         :return:
         """
-        parents = self.evaluated_robots()
-        p1 = self.select_parent(parents)
-        p2 = self.select_parent(list(parent for parent in parents if parent != p1))
-        return p1, p2
+        snapshot = self.fitness_snapshot().evaluated(self.conf)
+        (p1, p2), = select_pairs(snapshot.fitness, self.conf.tournament_size, 1)
+        return snapshot.robots[p1], snapshot.robots[p2]
 
     @trollius.coroutine
     def birth(self, tree, bbox, parents):
@@ -305,12 +286,7 @@ class OnlineEvoManager(World):
             pos.x = radius * math.cos(angle)
             pos.y = radius * math.sin(angle)
 
-            done = True
-            for robot in self.robots.values():
-                if robot.distance_to(pos, planar=True) < min_drop:
-                    done = False
-                    break
-
+            done = not self.robots_within(pos, min_drop)
             if done:
                 break
 
@@ -326,6 +302,7 @@ class OnlineEvoManager(World):
             rb.did_mate_with(ra)
 
         self.births += 1
+        BIRTHS.inc()
         fut = yield From(self.insert_robot(tree, Pose(position=pos), parents=parents))
         raise Return(fut)
 
@@ -335,16 +312,16 @@ class OnlineEvoManager(World):
         Kills selected robots.
         :return:
         """
-        robots = self.evaluated_robots()
-        fitness = [r.fitness() for r in robots]
-        avg = np.mean(fitness)
+        snapshot = self.fitness_snapshot().evaluated(self.conf)
+        robots = snapshot.robots
+        avg = np.mean(snapshot.fitness)
         cutoff = self.conf.kill_fraction * avg
-        to_kill = [r for r in robots if r.fitness() < cutoff]
+        to_kill = [robots[i] for i in np.flatnonzero(snapshot.fitness < cutoff)]
 
         if not to_kill and len(robots) == self.conf.population_limit:
             # Just kill the desired fraction
             n_kill = int(round(self.conf.kill_fraction * self.conf.population_limit))
-            to_kill = sorted(robots, key=lambda r: r.fitness())[:n_kill]
+            to_kill = [robots[i] for i in np.argsort(snapshot.fitness, kind='mergesort')[:n_kill]]
 
         # Never kill more than the required number of robots
         # for two completely different random tournaments (two is a
@@ -352,21 +329,24 @@ class OnlineEvoManager(World):
         max_kill = max(0, len(robots) - 2 * self.conf.tournament_size)
         to_kill = to_kill[:max_kill]
 
-        futs = []
-        write_deaths = self.csv_files['deaths']['csv']
+        write_deaths = self.csv_files['deaths']
 
         for robot in to_kill:
             print("Killing robot ID %d" % robot.robot.id)
             self.deaths += 1
-            fut = yield From(self.delete_robot(robot))
-            futs.append(fut)
+            DEATHS.inc()
 
             if write_deaths:
                 write_deaths.writerow((self.current_run, self.age(),
                                        robot.robot.id, robot.last_position.x,
                                        robot.last_position.y, robot.last_position.z))
 
-        print("Killed %d robots" % len(futs))
+        futs = []
+        if to_kill:
+            fut = yield From(self.delete_robots(to_kill))
+            futs.append(fut)
+
+        print("Killed %d robots" % len(to_kill))
         raise Return(futs)
 
     @trollius.coroutine
@@ -377,10 +357,9 @@ class OnlineEvoManager(World):
         """
         p1, p2 = self.select_parents()
 
-        for j in xrange(self.conf.max_mating_attempts):
-            pair = yield From(self.attempt_mate(p1, p2))
-            if pair:
-                raise Return((pair[0], pair[1], (p1, p2)))
+        pair = yield From(self.mate(p1, p2))
+        if pair:
+            raise Return((pair[0], pair[1], (p1, p2)))
 
         raise Return(False)
 
@@ -396,7 +375,8 @@ class OnlineEvoManager(World):
         :param parents:
         :return:
         """
-        return Robot(self.conf, robot_name, tree, robot, position, time, 0.0, parents)
+        return super(OnlineEvoManager, self).create_robot_manager(
+            robot_name, tree, robot, position, time, 0.0, parents)
 
     def evaluated_robots(self):
         """
@@ -409,7 +389,7 @@ class OnlineEvoManager(World):
         Returns the sum of the fitness of all robots in the system.
         :return:
         """
-        return reduce(lambda a, b: a + b.fitness(), self.robots.values(), 0.0)
+        return float(np.sum(self.fitness_snapshot().fitness))
 
     def total_size(self):
         """
@@ -422,23 +402,23 @@ class OnlineEvoManager(World):
         """
         :return:
         """
-        f = self.csv_files['fitness']['csv']
+        f = self.csv_files['fitness']
         if not f:
             return
 
         t = float(self.age())
         n = self.current_run
-        for robot in self.robots.values():
-            ds, dt = robot.displacement()
-            f.writerow([n, t, self.births, robot.robot.id,
-                        robot.age(), ds.norm(), robot.velocity(),
-                        robot.displacement_velocity(), robot.fitness()])
+        snapshot = self.fitness_snapshot()
+        for i, robot in enumerate(snapshot.robots):
+            f.writerow([n, t, self.births, snapshot.ids[i],
+                        robot.age(), snapshot.displacement[i], snapshot.velocity[i],
+                        snapshot.dvel[i], snapshot.fitness[i]])
 
     def log_summary(self):
         """
         :return:
         """
-        f = self.csv_files['summary']['csv']
+        f = self.csv_files['summary']
         if not f:
             return
 
@@ -507,6 +487,7 @@ class OnlineEvoManager(World):
 
         # Some variables
         real_time = time.time()
+        rates_start = self.births, self.deaths, None
         rtf_interval = 10.0
         sleep_time = 0.1
         started = False
@@ -517,6 +498,7 @@ class OnlineEvoManager(World):
         kill_interval = 2 * birth_interval
 
         while True:
+            INSERT_QUEUE.set(len(insert_queue))
             if insert_queue and (not started or timer('insert_queue', 1.0)):
                 tree, bbox, parents = insert_queue.pop()
                 res = yield From(self.birth(tree, bbox, parents))
@@ -556,6 +538,16 @@ class OnlineEvoManager(World):
                 real_time = nw
                 print("RTF: %f" % (rtf_interval / diff))
 
+                # Births and deaths per simulation minute, over the
+                # simulation time that actually passed since the last
+                # update (the timer fires after the interval is exceeded).
+                births, deaths, since = rates_start
+                sim_time = float(self.last_time)
+                if since is not None and sim_time > since:
+                    BIRTH_RATE.set((self.births - births) * 60.0 / (sim_time - since))
+                    DEATH_RATE.set((self.deaths - deaths) * 60.0 / (sim_time - since))
+                rates_start = self.births, self.deaths, sim_time
+
             if timer('death', kill_interval):
                 futs = yield From(self.kill_robots())
 
@@ -588,6 +580,7 @@ def run():
     """
     conf = parser.parse_args()
     world = yield From(OnlineEvoManager.create(conf))
+    world.register_metrics()
     yield From(world.run())
     yield From(world.teardown())
 
@@ -0,0 +1,54 @@
+"""
+Migrates existing output directories to the robot pack format (see
+`tol.output.pack`): all `robot_<id>.pb` files in each given directory
+are appended to a new pack. With `--delete`, the individual files are
+removed once the pack has been verified.
+
+Usage: python pack_robots.py [--delete] DIR [DIR ...]
+"""
+import os
+import sys
+sys.path.append(os.path.dirname(os.path.abspath(__file__))+'/../')
+
+from tol.output import OutputWriter, RobotPackWriter, RobotPackReader, RobotLoader, is_pack
+
+
+def migrate(directory, delete=False):
+    if is_pack(directory):
+        print("%s already contains a robot pack, skipping." % directory)
+        return
+
+    files = RobotLoader(directory)
+    ids = files.ids()
+
+    output = OutputWriter()
+    pack = RobotPackWriter(output, directory)
+    for robot_id in ids:
+        pack.write(robot_id, files.get_bytes(robot_id))
+
+    pack.close()
+    output.close()
+
+    reader = RobotPackReader(directory)
+    for robot_id in ids:
+        if reader.get_bytes(robot_id) != files.get_bytes(robot_id):
+            raise RuntimeError("Pack of %s does not match robot %d." % (directory, robot_id))
+
+    reader.close()
+    print("Packed %d robots in %s" % (len(ids), directory))
+
+    if delete:
+        for robot_id in ids:
+            os.remove(os.path.join(directory, 'robot_%d.pb' % robot_id))
+
+
+if __name__ == '__main__':
+    args = sys.argv[1:]
+    delete = '--delete' in args
+    dirs = [a for a in args if a != '--delete']
+    if not dirs:
+        print("Usage: %s [--delete] DIR [DIR ...]" % sys.argv[0])
+        sys.exit(1)
+
+    for d in dirs:
+        migrate(os.path.abspath(d), delete)
@@ -1,16 +1,19 @@
 import uuid
-from revolve.spec.msgs import Robot
 import os
 import sys
 sys.path.append(os.path.dirname(os.path.abspath(__file__))+'/../')
 
 from tol.spec import get_body_spec
 from tol.config import parser, make_revolve_config
+from tol.output import RobotLoader
 from sdfbuilder.math import Vector3
 
 conf = make_revolve_config(parser.parse_args())
 body_spec = get_body_spec(conf)
 
+# Robot loader of each output directory
+loaders = {}
+
 print("exp,run,robot_id,gene_id,origin_id,type,r,g,b")
 
 
@@ -44,9 +47,10 @@ def process_parts(robot_id, part, parent_parts, cur=None):
 
 
 def track_genes(basedir, robot_id, p1, p2, gene_map):
-    bot = Robot()
-    with open(basedir+'/robot_'+robot_id+'.pb', 'rb') as f:
-        bot.ParseFromString(f.read())
+    if basedir not in loaders:
+        loaders[basedir] = RobotLoader(basedir)
+
+    bot = loaders[basedir].get(robot_id)
 
     if p1:
         parent_parts = gene_map[p1] + gene_map[p2]
@@ -1,3 +1,10 @@
+import sys
+import os
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__))+'/../')
+
+from tol.output import ColumnarReader, is_columnar
+
 print("exp,run,births,robot_id")
 
 
@@ -9,7 +16,7 @@ def process_offline_dir(exp):
         f.readline()
 
         for line in f:
-            run, gen, robot_id, _, _, _, _ = line.split(',')
+            run, gen, robot_id = line.split(',')[:3]
 
             if gradual:
                 births = int(gen) + birth_fac
@@ -19,23 +26,39 @@ def process_offline_dir(exp):
             print("%s,%s,%d,%s" % (exp, run, births, robot_id))
 
 
-def process_online_dir(d):
-    with open('/media/expdata/online-output/'+d+'/fitness.csv') as f:
-        f.readline()
+def online_fitness_rows(d):
+    """
+    Iterates the (run, t_sim, births, robot_id) columns of the fitness log
+    of an online experiment, which is either a CSV file or a columnar table.
+    """
+    path = '/media/expdata/online-output/'+d+'/fitness'
+    if is_columnar(path):
+        for chunk in ColumnarReader(path).chunks():
+            for row in chunk[['run', 't_sim', 'births', 'robot_id']].tolist():
+                yield tuple(str(v) for v in row)
 
-        cur_births = 0
-        cur_t = ''
+        return
+
+    with open(path+'.csv') as f:
+        f.readline()
 
         for line in f:
             run, t_sim, births, robot_id, _, _, _, _, _ = line.split(',')
+            yield run, t_sim, births, robot_id
+
+
+def process_online_dir(d):
+    cur_births = 0
+    cur_t = ''
 
-            if t_sim != cur_t and births == cur_births:
-                continue
+    for run, t_sim, births, robot_id in online_fitness_rows(d):
+        if t_sim != cur_t and births == cur_births:
+            continue
 
-            cur_t = t_sim
-            cur_births = births
+        cur_t = t_sim
+        cur_births = births
 
-            print("embodied,%s,%s,%s" % (run, births, robot_id))
+        print("embodied,%s,%s,%s" % (run, births, robot_id))
 
 process_offline_dir('plus')
 process_offline_dir('plus-gradual')
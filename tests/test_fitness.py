@@ -0,0 +1,29 @@
+import argparse
+import unittest
+
+from tol.manage.robot import compute_fitness, optimistic_fitness
+
+CONF = argparse.Namespace(evaluation_time=10.0, warmup_time=1.0, fitness_size_discount=0.01,
+                          fitness_displacement_factor=5.0, fitness_velocity_factor=1.0,
+                          fitness_size_factor=0.0, fitness_limit=1.0)
+
+
+class OptimisticFitnessTest(unittest.TestCase):
+
+    def test_complete_evaluation(self):
+        # Without remaining time the estimate is the fitness itself
+        expected = compute_fitness(CONF, 11.0, 5, 0.02, 0.01)
+        self.assertAlmostEqual(optimistic_fitness(CONF, 5, 0.02, 0.01, 10.0, 0.1), expected)
+
+    def test_remaining_time(self):
+        partial = optimistic_fitness(CONF, 5, 0.02, 0.01, 5.0, 0.0)
+        optimistic = optimistic_fitness(CONF, 5, 0.02, 0.01, 5.0, 0.1)
+        self.assertGreater(optimistic, partial)
+
+        # The current velocity is used when it exceeds the speed bound
+        self.assertAlmostEqual(optimistic_fitness(CONF, 5, 0.02, 0.02, 5.0, 0.0),
+                               compute_fitness(CONF, 11.0, 5, 0.02, 0.02))
+
+
+if __name__ == '__main__':
+    unittest.main()
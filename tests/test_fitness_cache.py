@@ -0,0 +1,68 @@
+import argparse
+import unittest
+
+from tol.manage.fitness_cache import FitnessCache
+
+
+def make_conf(**kwargs):
+    conf = argparse.Namespace(**{k: 1.0 for k in FitnessCache.CONFIG_KEYS})
+    for k, v in kwargs.items():
+        setattr(conf, k, v)
+    return conf
+
+
+class FitnessCacheTest(unittest.TestCase):
+
+    def key(self, cache, genotype):
+        return genotype, cache.config_key
+
+    def test_lookup_statistics(self):
+        cache = FitnessCache(make_conf())
+        key = self.key(cache, 'a')
+        self.assertIsNone(cache.lookup(key))
+        cache.put(key, 1.0, 0.5)
+        self.assertEqual(cache.lookup(key), (1, 1.0, 0.5))
+        self.assertEqual(cache.state(), {'hits': 1, 'misses': 1, 'reevaluations': 0})
+
+        restored = FitnessCache(make_conf(), state=cache.state())
+        self.assertEqual(restored.hits, 1)
+        self.assertEqual(restored.misses, 1)
+
+    def test_reevaluation(self):
+        cache = FitnessCache(make_conf(), reevaluation_probability=1.0)
+        key = self.key(cache, 'a')
+        cache.put(key, 1.0, 0.5)
+        self.assertIsNone(cache.lookup(key))
+        self.assertEqual(cache.reevaluations, 1)
+
+    def test_put_averages(self):
+        cache = FitnessCache(make_conf())
+        key = self.key(cache, 'a')
+        cache.put(key, 1.0, 2.0)
+        cache.put(key, 2.0, 4.0)
+        n, velocity, dvel = cache.put(key, 3.0, 6.0)
+        self.assertEqual(n, 3)
+        self.assertAlmostEqual(velocity, 2.0)
+        self.assertAlmostEqual(dvel, 4.0)
+
+    def test_rows(self):
+        cache = FitnessCache(make_conf())
+        key = self.key(cache, 'a')
+        rows = [cache.row(key, cache.put(key, 1.0, 2.0)),
+                cache.row(key, cache.put(key, 3.0, 4.0))]
+
+        # Rows are read back from a CSV file as strings
+        rows = [[str(v) for v in row] for row in rows]
+
+        loaded = FitnessCache(make_conf())
+        loaded.load(rows)
+        self.assertEqual(len(loaded), 1)
+        self.assertEqual(loaded.get(key), (2, 2.0, 3.0))
+
+        other = FitnessCache(make_conf(evaluation_time=2.0))
+        other.load(rows)
+        self.assertEqual(len(other), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
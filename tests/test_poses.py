@@ -0,0 +1,51 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from tol.output import OutputWriter, PoseLog, PoseReader
+
+
+class PoseReaderTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.filename = os.path.join(self.directory, 'poses.bin')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def write(self, times):
+        output = OutputWriter()
+        log = PoseLog(output, self.filename)
+        log.append([(1, sec, nsec, 0.0, 0.0, 0.0) for sec, nsec in times])
+        log.close()
+        output.close()
+        return PoseReader(self.filename)
+
+    def test_single_run(self):
+        reader = self.write([(0, 0), (1, 0), (1, 999999999), (2, 500000000), (3, 0)])
+        self.assertEqual(reader.runs(), [(0, 5)])
+
+        records = reader.time_range(1.0, 3.0)
+        self.assertEqual(list(records['sec']), [1, 1, 2])
+        self.assertEqual(len(reader.time_range(start=2.0)), 2)
+        self.assertEqual(len(reader.time_range(end=1.5)), 2)
+
+    def test_runs(self):
+        reader = self.write([(0, 0), (1, 0), (2, 0), (0, 500000000), (1, 0), (2, 0)])
+        self.assertEqual(reader.runs(), [(0, 3), (3, 6)])
+        self.assertRaises(ValueError, reader.time_range, 1.0, 2.0)
+
+        records = reader.time_range(0.5, 2.0, run=1)
+        self.assertEqual(list(records['sec']), [0, 1])
+        self.assertEqual(list(reader.time_range(0.5, 2.0, run=0)['sec']), [1])
+
+    def test_empty(self):
+        reader = self.write([])
+        self.assertEqual(reader.runs(), [])
+        self.assertEqual(len(reader.time_range(0.0, 1.0)), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
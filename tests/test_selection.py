@@ -0,0 +1,33 @@
+import unittest
+import numpy as np
+
+from tol.util.selection import tournament, select_pairs
+
+
+class SelectionTest(unittest.TestCase):
+
+    def test_pairs_are_distinct(self):
+        rng = np.random.RandomState(0)
+        pairs = select_pairs(rng.random_sample(10), 3, 100, rng=rng)
+        self.assertEqual(pairs.shape, (100, 2))
+        self.assertTrue(np.all(pairs[:, 0] != pairs[:, 1]))
+        self.assertTrue(np.all((pairs >= 0) & (pairs < 10)))
+
+    def test_full_tournament(self):
+        # With every individual in the tournament the best two always win
+        fitness = np.array([0.3, 0.9, 0.1, 0.5])
+        pairs = select_pairs(fitness, 4, 20, rng=np.random.RandomState(1))
+        self.assertTrue(np.all(pairs[:, 0] == 1))
+        self.assertTrue(np.all(pairs[:, 1] == 3))
+
+    def test_tournament_size_one(self):
+        fitness = np.arange(5, dtype=float)
+        winners = tournament(fitness, 1, 1000, rng=np.random.RandomState(2))
+        self.assertEqual(set(winners), set(range(5)))
+
+    def test_too_few_individuals(self):
+        self.assertRaises(ValueError, select_pairs, [1.0], 2, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
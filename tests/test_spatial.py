@@ -0,0 +1,73 @@
+import collections
+import unittest
+
+from tol.manage.spatial import GridIndex
+from tol.manage.world import World
+
+Position = collections.namedtuple('Position', ['x', 'y'])
+
+
+class FakeRobot(object):
+
+    def __init__(self, x, y):
+        self.last_position = Position(x, y)
+
+
+class GridIndexTest(unittest.TestCase):
+
+    def setUp(self):
+        self.index = GridIndex(1.0)
+        for key, x, y in (('a', 0.5, 0.5), ('b', 1.5, 0.5), ('c', -3.0, 4.0)):
+            self.index.update(key, x, y)
+
+    def test_within(self):
+        self.assertEqual([k for _, k in self.index.within(0.0, 0.0, 1.6)], ['a', 'b'])
+        self.assertEqual(self.index.within(10.0, 10.0, 1.0), [])
+
+    def test_nearest(self):
+        self.assertEqual([k for _, k in self.index.nearest(0.0, 0.0, k=2)], ['a', 'b'])
+        self.assertEqual([k for _, k in self.index.nearest(-2.0, 3.0)], ['c'])
+        self.assertEqual(len(self.index.nearest(0.0, 0.0, k=10)), 3)
+
+    def test_move_and_remove(self):
+        self.index.update('a', 5.5, 5.5)
+        self.assertEqual([k for _, k in self.index.within(0.0, 0.0, 1.0)], [])
+        self.assertEqual([k for _, k in self.index.within(5.0, 5.0, 1.0)], ['a'])
+
+        self.index.remove('a')
+        self.index.remove('unknown')
+        self.assertNotIn('a', self.index)
+        self.assertEqual(self.index.keys(), {'b', 'c'})
+
+
+class WorldPositionsTest(unittest.TestCase):
+
+    def setUp(self):
+        # Only the position index state of a world is needed
+        self.world = World.__new__(World)
+        self.world.positions = GridIndex(1.0)
+        self.world.robots = {}
+
+    def test_skips_deleted_robots(self):
+        # Deleted robots stay in the index until the next state update
+        self.world.robots['a'] = FakeRobot(0.0, 0.0)
+        self.world.positions.update('a', 0.0, 0.0)
+        self.world.positions.update('gone', 0.1, 0.0)
+
+        self.assertEqual(self.world.robots_within(Position(0.0, 0.0), 1.0),
+                         [self.world.robots['a']])
+        self.assertEqual(self.world.nearest(Position(0.2, 0.0), k=2),
+                         [self.world.robots['a']])
+
+    def test_indexes_restored_robots(self):
+        # Restored robots are not indexed before the first state update
+        self.world.robots['a'] = FakeRobot(0.0, 0.0)
+        self.world.robots['b'] = FakeRobot(3.0, 0.0)
+
+        self.assertEqual(self.world.robots_within(Position(3.0, 0.0), 0.5),
+                         [self.world.robots['b']])
+        self.assertEqual(self.world.positions.keys(), {'a', 'b'})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,82 @@
+import unittest
+
+from tol.util.tree_hash import body_hash, genotype_hash
+
+
+class Message(object):
+    """
+    Stand-in for the robot protobuf messages.
+    """
+
+    def __init__(self, **kwargs):
+        self.__dict__.update(kwargs)
+
+
+def param(value):
+    return Message(value=value)
+
+
+def part(id, type, children=(), params=(), orientation=0.0):
+    return Message(id=id, type=type, orientation=orientation, param=[param(p) for p in params],
+                   child=[Message(src=src, dst=0, part=child) for src, child in children])
+
+
+def neuron(id, part_id, layer='hidden', params=()):
+    return Message(id=id, partId=part_id, layer=layer, type='Sigmoid',
+                   param=[param(p) for p in params])
+
+
+class Tree(object):
+
+    def __init__(self, root, neurons, connections):
+        self.robot = Message(body=Message(root=root),
+                             brain=Message(neuron=neurons, connection=connections))
+
+    def to_robot(self, robot_id=0):
+        return self.robot
+
+
+def make_tree(prefix, swap=False, weight=0.5, bias=1.0):
+    """
+    Core with a hinge and a brick attached, using part and neuron
+    IDs with the given prefix.
+    """
+    hinge = part(prefix + 'hinge', 'ActiveHinge', params=[0.1])
+    brick = part(prefix + 'brick', 'FixedBrick')
+    children = [(1, hinge), (2, brick)]
+    if swap:
+        children.reverse()
+
+    root = part(prefix + 'core', 'Core', children)
+    neurons = [neuron(prefix + 'hinge-out-0', prefix + 'hinge', 'output', [bias]),
+               neuron(prefix + 'core-in-0', prefix + 'core', 'input')]
+    if swap:
+        neurons.reverse()
+
+    connections = [Message(src=prefix + 'core-in-0', dst=prefix + 'hinge-out-0', weight=weight)]
+    return Tree(root, neurons, connections)
+
+
+class TreeHashTest(unittest.TestCase):
+
+    def test_ids_and_order_do_not_matter(self):
+        a, b = make_tree('a'), make_tree('b', swap=True)
+        self.assertEqual(body_hash(a), body_hash(b))
+        self.assertEqual(genotype_hash(a), genotype_hash(b))
+
+    def test_brain_changes(self):
+        a = make_tree('a')
+        for other in (make_tree('a', weight=0.6), make_tree('a', bias=2.0)):
+            self.assertEqual(body_hash(a), body_hash(other))
+            self.assertNotEqual(genotype_hash(a), genotype_hash(other))
+
+    def test_body_changes(self):
+        a = make_tree('a')
+        b = make_tree('a')
+        b.robot.body.root.child[0].part.param[0].value = 0.2
+        self.assertNotEqual(body_hash(a), body_hash(b))
+        self.assertNotEqual(genotype_hash(a), genotype_hash(b))
+
+
+if __name__ == '__main__':
+    unittest.main()
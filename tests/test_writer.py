@@ -0,0 +1,94 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from tol.output import OutputWriter, CsvFiles
+
+HEADERS = {'robots': ['id', 'name'], 'generations': ['run', 'generation']}
+
+
+class CsvFilesTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def read(self, name):
+        with open(os.path.join(self.directory, name + '.csv'), 'rb') as f:
+            return f.read().splitlines()
+
+    def open(self, headers=HEADERS, **kwargs):
+        output = OutputWriter(flush_interval=0.01)
+        return output, CsvFiles(output, self.directory, headers, **kwargs)
+
+    def close(self, output, files):
+        files.close()
+        output.close()
+
+    def test_snapshot_marks_every_file(self):
+        output, files = self.open()
+        files['robots'].writerow([1, 'a'])
+        marks = files.snapshot()
+        self.close(output, files)
+
+        self.assertEqual(set(marks), set(HEADERS))
+        self.assertEqual(marks['robots'], len("id,name\r\n1,a\r\n"))
+
+        # Files without rows are marked after their header
+        self.assertEqual(marks['generations'], len("run,generation\r\n"))
+
+    def test_restore_truncates_to_marks(self):
+        output, files = self.open()
+        files['robots'].writerow([1, 'a'])
+        marks = files.snapshot()
+        files['robots'].writerow([2, 'b'])
+        files['generations'].writerow([1, 1])
+        self.close(output, files)
+
+        output, files = self.open(restore=True, marks=marks)
+        files['robots'].writerow([3, 'c'])
+        self.close(output, files)
+
+        self.assertEqual(self.read('robots'), ['id,name', '1,a', '3,c'])
+        self.assertEqual(self.read('generations'), ['run,generation'])
+
+    def test_restore_keeps_files_missing_from_marks(self):
+        output, files = self.open()
+        marks = files.snapshot()
+        self.close(output, files)
+
+        with open(os.path.join(self.directory, 'extra.csv'), 'wb') as f:
+            f.write("x\r\n1\r\n")
+
+        headers = dict(HEADERS, extra=['x'])
+        output, files = self.open(headers, restore=True, marks=marks)
+        files['extra'].writerow([2])
+        self.close(output, files)
+
+        self.assertEqual(self.read('extra'), ['x', '1', '2'])
+
+    def test_restore_creates_files_missing_from_snapshot(self):
+        output, files = self.open()
+        marks = files.snapshot()
+        self.close(output, files)
+
+        headers = dict(HEADERS, extra=['x'])
+        output, files = self.open(headers, restore=True, marks=marks)
+        files['extra'].writerow([1])
+        self.close(output, files)
+
+        self.assertEqual(self.read('extra'), ['x', '1'])
+
+    def test_no_directory(self):
+        output = OutputWriter()
+        files = CsvFiles(output, None, HEADERS)
+        self.assertIsNone(files['robots'])
+        self.assertEqual(files.snapshot(), {})
+        output.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -87,6 +87,34 @@ parser.add_argument(
          " updates (in number of times per *simulation* second)."
 )
 
+parser.add_argument(
+    '--adaptive-pose-frequency',
+    default=False, type=str_to_bool,
+    help="Lower the pose update frequency when pose messages cannot be processed"
+         " in time, and raise it again (up to `--max-pose-update-frequency`) when"
+         " they can."
+)
+
+parser.add_argument(
+    '--min-pose-update-frequency',
+    default=1.0, type=float,
+    help="Lower bound of the adaptive pose update frequency."
+)
+
+parser.add_argument(
+    '--max-pose-update-frequency',
+    default=0, type=float,
+    help="Upper bound of the adaptive pose update frequency, defaults to"
+         " `--pose-update-frequency`."
+)
+
+parser.add_argument(
+    '--target-pose-lag',
+    default=0.5, type=float,
+    help="Pose message lag in wall clock seconds the adaptive pose update"
+         " frequency aims to stay below."
+)
+
 parser.add_argument(
     '--evaluation-time',
     default=12, type=float,
@@ -197,6 +225,14 @@ parser.add_argument(
     help="Host:port of the body analyzer (set to empty string to ignore)."
 )
 
+parser.add_argument(
+    '--local-analyzer',
+    default=False, type=str_to_bool,
+    help="Check robot bodies for intersecting parts in the manager process rather"
+         " than using the external body analyzer. This is always done when the"
+         " analyzer address is empty."
+)
+
 parser.add_argument(
     '--gazebo-cmd',
     default='gzserver', type=str,
@@ -247,8 +283,14 @@ parser.add_argument(
 # - The `poses.csv` file containing each robot pose through time, in the format
 #   id,sim_time_sec,sim_time_nsec,x,y,z
 #
+# With `--pose-log`, poses are also written to `poses.bin`, a binary log
+# of fixed-width records in the same format (see `tol.output.poses`), which
+# is much cheaper to write and can be memory mapped when read back.
+#
 # Additionally, the `Robot` protobuf message for each bot is written to
-# a file called `robot_[ID].pb` when the robot is first registered.
+# a file called `robot_[ID].pb` when the robot is first registered. With
+# `--robot-pack`, these messages are appended to a single indexed pack file
+# instead (see `tol.output.pack`).
 #
 # The files are written to a new YYYYMMDDHHIISS directory within the
 # specified output directory, unless a subdirectory is explicitly
@@ -344,6 +386,15 @@ parser.add_argument(
     help="Maximum number of mating attempts between two parents."
 )
 
+parser.add_argument(
+    '--speculative-mating',
+    default=1, type=int,
+    help="Number of candidate children that are created together in each round"
+         " of mating attempts between two parents. The candidates are analyzed one"
+         " after the other and the first viable child is used. Analyses are not"
+         " pipelined, so this does not lower birth latency."
+)
+
 
 parser.add_argument(
     '--world-step-size',
@@ -353,6 +404,134 @@ parser.add_argument(
 )
 
 
+parser.add_argument(
+    '--max-inflight-requests',
+    default=16, type=int,
+    help="Maximum number of insert / delete requests that can be awaiting a"
+         " response from the simulator at the same time."
+)
+
+parser.add_argument(
+    '--request-timeout',
+    default=0, type=float,
+    help="Number of seconds after which an unanswered simulator request is"
+         " considered timed out, 0 to wait indefinitely."
+)
+
+parser.add_argument(
+    '--request-retries',
+    default=0, type=int,
+    help="Number of times a timed out simulator request is resent before"
+         " giving up."
+)
+
+
+parser.add_argument(
+    '--analyzer-cache-size',
+    default=0, type=int,
+    help="Number of body analyzer results that are cached by body structure,"
+         " 0 (the default) disables the cache."
+)
+
+parser.add_argument(
+    '--persist-analyzer-cache',
+    default=False, type=str_to_bool,
+    help="Store the body analyzer cache in the output directory, so it is"
+         " reused when the experiment is restored."
+)
+
+
+parser.add_argument(
+    '--spatial-cell-size',
+    default=1.0, type=float,
+    help="Cell size in meters of the grid used to look up robots by position."
+)
+
+
+parser.add_argument(
+    '--output-flush-interval',
+    default=1.0, type=float,
+    help="Interval in seconds at which output files are flushed by the"
+         " background writer."
+)
+
+parser.add_argument(
+    '--output-durability',
+    default='flush', type=str, choices=['flush', 'fsync'],
+    help="Whether output files are only flushed, or also synced to disk"
+         " at every flush interval and snapshot."
+)
+
+parser.add_argument(
+    '--output-queue-size',
+    default=10000, type=int,
+    help="Maximum number of pending output writes, logging blocks when"
+         " this number is reached."
+)
+
+
+parser.add_argument(
+    '--pose-log',
+    default=False, type=str_to_bool,
+    help="Write robot poses to a binary pose log in the output directory."
+)
+
+parser.add_argument(
+    '--pose-log-orientation',
+    default=False, type=str_to_bool,
+    help="Include the orientation of the robots in the binary pose log."
+)
+
+parser.add_argument(
+    '--robot-pack',
+    default=False, type=str_to_bool,
+    help="Write robot protobuf messages to an indexed pack file rather"
+         " than to a separate file per robot."
+)
+
+parser.add_argument(
+    '--columnar-output',
+    default=False, type=str_to_bool,
+    help="Write high volume logs (such as the online fitness log) as chunked"
+         " NumPy tables rather than CSV files."
+)
+
+parser.add_argument(
+    '--columnar-chunk-size',
+    default=10000, type=int,
+    help="Number of rows per chunk in columnar output."
+)
+
+parser.add_argument(
+    '--metrics-port',
+    default=0, type=int,
+    help="Serve runtime metrics in the Prometheus text format on this local"
+         " port, 0 to disable."
+)
+
+parser.add_argument(
+    '--metrics-file',
+    default="", type=str,
+    help="Periodically append runtime metrics as JSON lines to this file in"
+         " the output directory, empty to disable."
+)
+
+parser.add_argument(
+    '--metrics-interval',
+    default=10.0, type=float,
+    help="Seconds between writes of the metrics file."
+)
+
+
+parser.add_argument(
+    '--profile',
+    default=False, type=str_to_bool,
+    help="Time the main world manager coroutines and write the result to"
+         " `profile.folded` in the output directory, in the collapsed stack"
+         " format read by flame graph tools."
+)
+
+
 def make_revolve_config(conf):
     """
     Turns a `tol` config object into a revolve.angle.robogen compatible config
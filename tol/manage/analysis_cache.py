@@ -0,0 +1,92 @@
+from __future__ import absolute_import
+import os
+import pickle
+from collections import OrderedDict
+
+from ..logging import logger
+
+
+class AnalysisCache(object):
+    """
+    LRU cache of body analyzer results, keyed by the canonical
+    body hash of the analyzed tree (see `tol.util.tree_hash`).
+    """
+
+    def __init__(self, size, filename=None):
+        """
+        :param size: Maximum number of cached results
+        :type size: int
+        :param filename: File the cache is persisted to, if any. If this
+                         file exists the cache is initialized from it.
+        :type filename: str
+        :return:
+        """
+        self.size = size
+        self.filename = filename
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+
+        if filename and os.path.exists(filename):
+            self.load()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        """
+        :param key: Body hash
+        :return: The cached `(intersects, bbox)` result, or `None` on a miss.
+        """
+        try:
+            value = self._entries.pop(key)
+        except KeyError:
+            self.misses += 1
+            return None
+
+        # Reinsert to mark as most recently used
+        self._entries[key] = value
+        self.hits += 1
+        return value
+
+    def put(self, key, value):
+        """
+        :param key: Body hash
+        :param value: Analyzer result
+        :return:
+        """
+        self._entries.pop(key, None)
+        self._entries[key] = value
+
+        while len(self._entries) > self.size:
+            self._entries.popitem(last=False)
+
+    def load(self):
+        """
+        Reads the cache entries from the cache file.
+        :return:
+        """
+        try:
+            with open(self.filename, 'rb') as f:
+                entries = pickle.load(f)
+        except (IOError, EOFError, pickle.UnpicklingError) as e:
+            logger.warning("Could not read analyzer cache `%s`: %s" % (self.filename, e))
+            return
+
+        self._entries = OrderedDict(entries[-self.size:] if self.size else [])
+
+    def save(self):
+        """
+        Writes the cache entries to the cache file, if there is one.
+        :return:
+        """
+        if not self.filename:
+            return
+
+        tmp = self.filename + '.tmp'
+        with open(tmp, 'wb') as f:
+            pickle.dump(list(self._entries.items()), f, pickle.HIGHEST_PROTOCOL)
+
+        os.rename(tmp, self.filename)
+        logger.debug("Saved %d analyzer results (%d hits / %d misses)." % (
+            len(self._entries), self.hits, self.misses))
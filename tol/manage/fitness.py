@@ -0,0 +1,75 @@
+from __future__ import absolute_import
+import numpy as np
+
+from .robot import compute_fitness
+
+
+class FitnessSnapshot(object):
+    """
+    Fitness statistics of a list of robots at a single moment, stored
+    as arrays indexed in the same order as `robots`. A snapshot is
+    computed once per state update and shared by selection, culling
+    and logging until the next update.
+    """
+
+    def __init__(self, robots, ages, sizes, velocity, dvel, displacement, fitness):
+        """
+        :param robots:
+        :type robots: list[Robot]
+        :param ages: Robot ages in seconds
+        :param sizes:
+        :param velocity:
+        :param dvel: Displacement velocities
+        :param displacement: Displacement distances
+        :param fitness:
+        :return:
+        """
+        self.robots = robots
+        self.ids = np.array([r.robot.id for r in robots], dtype=int)
+        self.names = frozenset(r.name for r in robots)
+        self.ages = ages
+        self.sizes = sizes
+        self.velocity = velocity
+        self.dvel = dvel
+        self.displacement = displacement
+        self.fitness = fitness
+
+    @classmethod
+    def create(cls, world, robots):
+        """
+        :param world:
+        :type world: World
+        :param robots:
+        :type robots: list[Robot]
+        :return:
+        :rtype: FitnessSnapshot
+        """
+        ages = np.array([float(r.age()) for r in robots], dtype=float)
+        sizes = np.array([r.size for r in robots], dtype=float)
+        velocity, dvel, disp, _ = world.population_stats(robots)
+        fitness = compute_fitness(world.conf, ages, sizes, velocity, dvel)
+        return cls(robots, ages, sizes, velocity, dvel,
+                   np.linalg.norm(disp, axis=1), fitness)
+
+    def __len__(self):
+        return len(self.robots)
+
+    def subset(self, mask):
+        """
+        :param mask: Boolean mask or index array
+        :return: Snapshot of the selected robots only
+        :rtype: FitnessSnapshot
+        """
+        indices = np.arange(len(self.robots))[mask]
+        return FitnessSnapshot([self.robots[i] for i in indices], self.ages[indices],
+                               self.sizes[indices], self.velocity[indices], self.dvel[indices],
+                               self.displacement[indices], self.fitness[indices])
+
+    def evaluated(self, conf):
+        """
+        :param conf:
+        :return: Snapshot of the robots that are at least one
+                 full evaluation time old.
+        :rtype: FitnessSnapshot
+        """
+        return self.subset(self.ages >= (conf.warmup_time + conf.evaluation_time))
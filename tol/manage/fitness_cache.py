@@ -0,0 +1,120 @@
+from __future__ import absolute_import
+import random
+
+from ..util.tree_hash import genotype_hash
+
+
+class FitnessCache(object):
+    """
+    Cache of measured speed statistics, keyed by the canonical genotype
+    hash of the evaluated tree (see `tol.util.tree_hash`) together with
+    the configuration that affects the evaluation. Every entry is the
+    mean of all evaluations of its genotype, so re-evaluating a known
+    genotype averages out simulation noise.
+
+    Entries are persisted as rows (see `row` and `load`) appended to a
+    file on every change, rather than with the experiment snapshot, so
+    snapshots do not grow with the number of known genotypes.
+    """
+
+    # Configuration values a cached result depends on
+    CONFIG_KEYS = ('evaluation_time', 'warmup_time', 'pose_update_frequency',
+                   'fitness_size_discount', 'fitness_displacement_factor',
+                   'fitness_velocity_factor', 'fitness_size_factor', 'fitness_limit')
+
+    def __init__(self, conf, reevaluation_probability=0.0, state=None):
+        """
+        :param conf:
+        :param reevaluation_probability: Probability with which a known
+                                         genotype is evaluated again.
+        :type reevaluation_probability: float
+        :param state: Statistics to restore, as returned by `state`
+        :type state: dict
+        :return:
+        """
+        self.config_key = tuple(getattr(conf, k) for k in self.CONFIG_KEYS)
+        self._config_str = ';'.join(repr(v) for v in self.config_key)
+        self.reevaluation_probability = reevaluation_probability
+        state = state or {}
+        self.hits = state.get('hits', 0)
+        self.misses = state.get('misses', 0)
+        self.reevaluations = state.get('reevaluations', 0)
+
+        # key => (evaluation count, mean velocity, mean displacement velocity)
+        self._entries = {}
+
+    def __len__(self):
+        return len(self._entries)
+
+    def state(self):
+        """
+        :return: The cache statistics, for experiment snapshots
+        """
+        return {'hits': self.hits, 'misses': self.misses, 'reevaluations': self.reevaluations}
+
+    def row(self, key, entry):
+        """
+        :param key:
+        :param entry:
+        :return: Row that persists the given entry
+        """
+        return [key[0], self._config_str] + list(entry)
+
+    def load(self, rows):
+        """
+        Loads the entries of the given rows, later rows replace earlier
+        ones. Rows written with a different configuration are skipped.
+        :param rows: Iterable of rows as written by `row`, as strings
+        :return:
+        """
+        for genotype, config, n, velocity, dvel in rows:
+            if config == self._config_str:
+                self._entries[(genotype, self.config_key)] = (int(n), float(velocity), float(dvel))
+
+    def key(self, tree):
+        """
+        :param tree:
+        :type tree: Tree
+        :return: Cache key of the given tree
+        """
+        return genotype_hash(tree), self.config_key
+
+    def get(self, key):
+        """
+        :param key:
+        :return: The cached `(count, velocity, displacement velocity)`
+                 entry, or `None` if the genotype is unknown.
+        """
+        return self._entries.get(key)
+
+    def lookup(self, key):
+        """
+        Decides whether the genotype with the given key has to
+        be simulated, and keeps the hit / miss statistics.
+        :param key:
+        :return: The cached entry if the simulation can be skipped,
+                 `None` otherwise.
+        """
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+
+        if random.random() < self.reevaluation_probability:
+            self.reevaluations += 1
+            return None
+
+        self.hits += 1
+        return entry
+
+    def put(self, key, velocity, dvel):
+        """
+        Adds an evaluation result to the mean of its genotype.
+        :param key:
+        :param velocity:
+        :param dvel:
+        :return: The updated entry
+        """
+        n, v, d = self._entries.get(key, (0, 0.0, 0.0))
+        entry = self._entries[key] = (n + 1, v + (velocity - v) / (n + 1), d + (dvel - d) / (n + 1))
+        return entry
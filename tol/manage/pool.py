@@ -0,0 +1,268 @@
+from __future__ import absolute_import
+import copy
+import os
+import subprocess
+import time
+import trollius
+from trollius import From, Return
+
+from ..logging import logger
+from .world import World
+
+
+class SimulatorProcess(object):
+    """
+    A gzserver process with its own Gazebo master port.
+    """
+
+    def __init__(self, gazebo_cmd, world_file, port):
+        """
+        :param gazebo_cmd: Gazebo command, usually `gzserver`
+        :param world_file:
+        :param port: Gazebo master port
+        :return:
+        """
+        self.gazebo_cmd = gazebo_cmd
+        self.world_file = world_file
+        self.port = port
+        self.process = None
+
+    def start(self):
+        """
+        Starts the simulator paused. Plugin and model paths are
+        inherited from the environment of this process.
+        :return:
+        """
+        env = dict(os.environ, GAZEBO_MASTER_URI="http://127.0.0.1:%d" % self.port)
+        with open(os.devnull, 'w') as devnull:
+            self.process = subprocess.Popen([self.gazebo_cmd, '-u', self.world_file],
+                                            env=env, stdout=devnull, stderr=devnull)
+
+    def stop(self):
+        """
+        :return:
+        """
+        if self.process is None or self.process.poll() is not None:
+            return
+
+        self.process.terminate()
+        deadline = time.time() + 5.0
+        while self.process.poll() is None and time.time() < deadline:
+            time.sleep(0.1)
+
+        if self.process.poll() is None:
+            self.process.kill()
+            self.process.wait()
+
+
+class PoolWorker(object):
+    """
+    A simulator process and the world manager connected to it. The
+    manager draws robot IDs from the master world, so robots evaluated
+    by different workers never share an ID.
+    """
+
+    def __init__(self, index, master, world_class, conf, world_file, port):
+        """
+        :param index:
+        :param master: World that owns the pool
+        :param world_class: World class used to connect to the simulator
+        :type world_class: type
+        :param conf: Configuration of the worker world
+        :param world_file:
+        :param port:
+        :return:
+        """
+        self.index = index
+        self.master = master
+        self.world_class = world_class
+        self.conf = conf
+        self.process = SimulatorProcess(conf.gazebo_cmd, world_file, port)
+        self.world = None
+
+    @trollius.coroutine
+    def start(self, attempts=30):
+        """
+        Starts the simulator and connects to it, retrying
+        while the simulator is starting up.
+        :param attempts:
+        :return:
+        """
+        self.process.start()
+        cls = self.world_class
+        for i in xrange(attempts):
+            yield From(trollius.sleep(1.0))
+            world = cls(_private=cls._PRIVATE, conf=self.conf)
+            try:
+                yield From(world._init())
+            except Exception as e:
+                # Release the output writer of the failed attempt
+                world.close_outputs()
+                if i == attempts - 1:
+                    self.process.stop()
+                    raise
+
+                logger.debug("Worker %d not yet available (%s)" % (self.index, e))
+                continue
+
+            self.world = world
+            break
+
+        self.world.get_robot_id = self.master.get_robot_id
+
+    @trollius.coroutine
+    def stop(self):
+        """
+        :return:
+        """
+        if self.world is not None:
+            try:
+                yield From(self.world.teardown())
+            except Exception:
+                logger.exception("Error tearing down worker %d." % self.index)
+
+            self.world = None
+
+        self.process.stop()
+
+    @trollius.coroutine
+    def restart(self):
+        """
+        Restarts the simulator, used when it has become slow.
+        :return:
+        """
+        logger.warning("Restarting simulator of worker %d." % self.index)
+        yield From(self.stop())
+        yield From(self.start())
+
+
+class EvaluationPool(object):
+    """
+    Pool of simulators that evaluate robots in parallel. Evaluations
+    are dispatched to free workers, results are returned in the order
+    of the input. A worker of which an evaluation fails or takes
+    longer than `slowdown_threshold` wall clock seconds is restarted
+    before it receives its next evaluation; if the restart fails the
+    worker is taken out of service.
+    """
+
+    def __init__(self, master, world_file, size, base_port, slowdown_threshold=None):
+        """
+        :param master: World that owns the pool
+        :type master: World
+        :param world_file: Simulation world file
+        :param size: Number of workers
+        :param base_port: Gazebo master port of the first worker
+        :param slowdown_threshold: Wall clock seconds after which an
+                                   evaluation is considered slow.
+        :return:
+        """
+        conf = master.conf
+        self.slowdown_threshold = slowdown_threshold
+        self.workers = []
+
+        for i in xrange(size):
+            port = base_port + i
+            wconf = copy.copy(conf)
+            wconf.world_address = "127.0.0.1:%d" % port
+            wconf.analyzer_address = ""
+            wconf.local_analyzer = True
+            wconf.output_directory = None
+            wconf.restore_directory = None
+            wconf.metrics_port = 0
+            wconf.profile = False
+            self.workers.append(PoolWorker(i, master, World, wconf, world_file, port))
+
+        self._free = trollius.Queue()
+        self._active = set()
+
+    @trollius.coroutine
+    def start(self):
+        """
+        Starts all workers.
+        :return:
+        """
+        yield From(trollius.gather(*[w.start() for w in self.workers]))
+        for worker in self.workers:
+            self._active.add(worker)
+            self._free.put_nowait(worker)
+
+    @trollius.coroutine
+    def stop(self):
+        """
+        :return:
+        """
+        yield From(trollius.gather(*[w.stop() for w in self.workers]))
+
+    @trollius.coroutine
+    def map(self, fn, items):
+        """
+        Evaluates all items.
+
+        :param fn: Coroutine function called as `fn(world, *item)`
+        :param items: List of argument tuples
+        :return: List of `(result, wall clock time)` tuples in the order of `items`
+        """
+        results = [None] * len(items)
+        tasks = []
+        for i, item in enumerate(items):
+            worker = yield From(self._free.get())
+            if worker is None:
+                # Put back for other waiting callers
+                self._free.put_nowait(None)
+                raise RuntimeError("All evaluation workers are out of service.")
+
+            tasks.append(trollius.Task(self._run(worker, fn, item, results, i)))
+
+        yield From(trollius.gather(*tasks))
+        raise Return(results)
+
+    @trollius.coroutine
+    def _run(self, worker, fn, item, results, i):
+        """
+        Runs a single evaluation on the given worker. A worker of which
+        the evaluation failed is restarted, since its world is left in
+        an unknown state.
+        """
+        error = None
+        before = time.time()
+        try:
+            result = yield From(fn(worker.world, *item))
+        except Exception as e:
+            logger.exception("Evaluation on worker %d failed." % worker.index)
+            error = e
+            restart = True
+        else:
+            elapsed = time.time() - before
+            results[i] = (result, elapsed)
+            restart = self.slowdown_threshold and elapsed > self.slowdown_threshold
+
+        yield From(self._release(worker, restart))
+        if error is not None:
+            raise error
+
+    @trollius.coroutine
+    def _release(self, worker, restart=False):
+        """
+        Returns a worker to the free workers, restarting it first if
+        requested. A worker that fails to restart is taken out of service.
+        """
+        if restart:
+            try:
+                yield From(worker.restart())
+            except Exception:
+                logger.exception("Error restarting worker %d." % worker.index)
+                self._retire(worker)
+                return
+
+        self._free.put_nowait(worker)
+
+    def _retire(self, worker):
+        """
+        Takes a worker of which the restart failed out of service.
+        """
+        logger.error("Worker %d could not be restarted, taking it out of service." % worker.index)
+        self._active.discard(worker)
+        if not self._active:
+            # Wake up callers waiting for a free worker
+            self._free.put_nowait(None)
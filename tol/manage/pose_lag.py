@@ -0,0 +1,149 @@
+from __future__ import absolute_import
+from collections import deque
+
+
+class PoseLagMonitor(object):
+    """
+    Measures how far the processing of pose messages lags behind the
+    simulation. The simulation time of the world is taken from the world
+    statistics messages, which arrive independently of the pose messages,
+    and extrapolated to the present using the real time factor reported
+    in them. The lag of a pose message is the simulation time that has
+    passed since it was stamped, converted to wall clock seconds:
+
+        lag = (world sim time - message sim time) / rtf
+
+    The real time factor is measured over the statistics of the last
+    `window` wall clock seconds.
+    """
+
+    def __init__(self, window=5.0):
+        """
+        :param window: Wall clock seconds over which the real time
+                       factor is measured.
+        :type window: float
+        :return:
+        """
+        self.window = window
+        self.lag = 0.0
+
+        # (arrival wall time, sim time, real time) of world statistics
+        self._stats = deque()
+
+    def reset(self):
+        self.lag = 0.0
+        self._stats.clear()
+
+    def rtf(self):
+        """
+        :return: Real time factor over the current window, or `None`
+        """
+        if len(self._stats) < 2:
+            return None
+
+        (_, s0, r0), (_, s1, r1) = self._stats[0], self._stats[-1]
+        return (s1 - s0) / (r1 - r0) if r1 > r0 and s1 > s0 else None
+
+    def world_stats(self, wall_time, sim_time, real_time):
+        """
+        Registers the arrival of a world statistics message.
+        :param wall_time: Arrival time in wall clock seconds
+        :param sim_time: Simulation time of the world in seconds
+        :param real_time: Real time of the world in seconds
+        :return:
+        """
+        stats = self._stats
+        if stats and sim_time < stats[-1][1]:
+            # The world was reset
+            self.reset()
+
+        stats.append((wall_time, sim_time, real_time))
+        while len(stats) > 2 and wall_time - stats[0][0] > self.window:
+            stats.popleft()
+
+    def world_time(self, wall_time):
+        """
+        :param wall_time:
+        :return: Estimated simulation time of the world at the given
+                 wall clock time, or `None` if it is unknown.
+        """
+        if not self._stats:
+            return None
+
+        w, s, _ = self._stats[-1]
+        rtf = self.rtf()
+        return s + (wall_time - w) * rtf if rtf else s
+
+    def update(self, wall_time, sim_time):
+        """
+        Registers the processing of a pose message.
+        :param wall_time: Processing time in wall clock seconds
+        :param sim_time: Simulation time of the message in seconds
+        :return: The current lag estimate in seconds
+        """
+        world_time = self.world_time(wall_time)
+        if world_time is None:
+            return self.lag
+
+        rtf = self.rtf() or 1.0
+        self.lag = max(0.0, world_time - sim_time) / rtf
+        return self.lag
+
+
+class FrequencyController(object):
+    """
+    Adapts the requested pose update frequency to the measured pose lag:
+    the frequency is lowered while the mean lag over an interval exceeds
+    `target_lag`, and raised again while it stays well below it.
+    """
+
+    def __init__(self, frequency, min_frequency, max_frequency, target_lag,
+                 interval=10.0, step=1.25):
+        """
+        :param frequency: Initial frequency
+        :param min_frequency:
+        :param max_frequency:
+        :param target_lag: Maximum acceptable lag in seconds
+        :param interval: Wall clock seconds between adjustments
+        :param step: Factor by which the frequency is changed
+        :return:
+        """
+        self.frequency = frequency
+        self.min_frequency = min_frequency
+        self.max_frequency = max_frequency
+        self.target_lag = target_lag
+        self.interval = interval
+        self.step = step
+        self._start = None
+        self._lag_sum = 0.0
+        self._lag_count = 0
+
+    def update(self, wall_time, lag):
+        """
+        :param wall_time:
+        :param lag: Current lag estimate
+        :return: The new frequency if it should be changed, `None` otherwise
+        """
+        if self._start is None:
+            self._start = wall_time
+
+        self._lag_sum += lag
+        self._lag_count += 1
+        if wall_time - self._start < self.interval:
+            return None
+
+        mean_lag = self._lag_sum / self._lag_count
+        self._start, self._lag_sum, self._lag_count = wall_time, 0.0, 0
+
+        if mean_lag > self.target_lag:
+            frequency = max(self.min_frequency, self.frequency / self.step)
+        elif mean_lag < 0.25 * self.target_lag:
+            frequency = min(self.max_frequency, self.frequency * self.step)
+        else:
+            return None
+
+        if frequency == self.frequency:
+            return None
+
+        self.frequency = frequency
+        return frequency
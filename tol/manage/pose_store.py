@@ -0,0 +1,168 @@
+from __future__ import absolute_import
+import numpy as np
+
+
+class PoseStore(object):
+    """
+    Struct-of-arrays store of the recent positions of all robots in
+    the world. Every robot is assigned a slot, which holds a ring buffer
+    of sample times, x / y / z positions and the cumulative distance
+    travelled at each sample.
+
+    Velocities and displacements are computed over the samples in the
+    last `window_time` seconds of each ring buffer, which matches the
+    robot speed window, and can be computed for the whole population
+    in one vectorized pass. Samples can be queued one at a time with
+    `push` while a pose message is handled, and are then written in one
+    batch by `flush`.
+    """
+
+    def __init__(self, length, window_time=None, capacity=32):
+        """
+        :param length: Number of samples kept per robot
+        :type length: int
+        :param window_time: Length of the speed window in seconds, if `None`
+                            all samples in the ring buffer are used.
+        :type window_time: float
+        :param capacity: Initial number of slots
+        :type capacity: int
+        :return:
+        """
+        self.length = max(2, length)
+        self.window_time = window_time
+        self.capacity = 0
+        self.times = np.zeros((0, self.length))
+        self.positions = np.zeros((0, self.length, 3))
+        self.distance = np.zeros((0, self.length))
+        self.valid = np.zeros((0, self.length), dtype=bool)
+        self.head = np.zeros(0, dtype=int)
+        self.count = np.zeros(0, dtype=int)
+        self._free = []
+        self._pending = ([], [], [])
+        self._grow(capacity)
+
+    def _grow(self, capacity):
+        """
+        Increases the number of slots to `capacity`.
+        """
+        extra = capacity - self.capacity
+        if extra <= 0:
+            return
+
+        self.times = np.concatenate([self.times, np.zeros((extra, self.length))])
+        self.positions = np.concatenate([self.positions, np.zeros((extra, self.length, 3))])
+        self.distance = np.concatenate([self.distance, np.zeros((extra, self.length))])
+        self.valid = np.concatenate([self.valid, np.zeros((extra, self.length), dtype=bool)])
+        self.head = np.concatenate([self.head, np.zeros(extra, dtype=int)])
+        self.count = np.concatenate([self.count, np.zeros(extra, dtype=int)])
+        self._free.extend(reversed(xrange(self.capacity, capacity)))
+        self.capacity = capacity
+
+    def allocate(self):
+        """
+        :return: A free, empty slot
+        :rtype: int
+        """
+        if not self._free:
+            self._grow(max(1, 2 * self.capacity))
+
+        slot = self._free.pop()
+        self.valid[slot] = False
+        self.head[slot] = 0
+        self.count[slot] = 0
+        return slot
+
+    def release(self, slot):
+        """
+        :param slot:
+        :return:
+        """
+        self.valid[slot] = False
+        self.count[slot] = 0
+        self._free.append(slot)
+
+    def append(self, slots, times, positions):
+        """
+        Appends one sample for each of the given (distinct) slots.
+        :param slots: Sequence of slots
+        :param times: Sequence of sample times in seconds
+        :param positions: Sequence of (x, y, z) positions
+        :return:
+        """
+        slots = np.asarray(slots, dtype=int)
+        if not len(slots):
+            return
+
+        positions = np.asarray(positions, dtype=float).reshape(-1, 3)
+        prev = self.head[slots]
+        has_prev = self.count[slots] > 0
+
+        step = np.linalg.norm(positions - self.positions[slots, prev], axis=1)
+        dist = np.where(has_prev, self.distance[slots, prev] + step, 0.0)
+        head = np.where(has_prev, (prev + 1) % self.length, 0)
+
+        self.head[slots] = head
+        self.times[slots, head] = times
+        self.positions[slots, head] = positions
+        self.distance[slots, head] = dist
+        self.valid[slots, head] = True
+        self.count[slots] += 1
+
+    def push(self, slot, t, position):
+        """
+        Queues a sample for the given slot, see `flush`.
+        :param slot:
+        :param t: Sample time in seconds
+        :param position: (x, y, z) position
+        :return:
+        """
+        slots, times, positions = self._pending
+        slots.append(slot)
+        times.append(t)
+        positions.append(position)
+
+    def flush(self):
+        """
+        Appends the queued samples, at most one per slot.
+        :return:
+        """
+        slots, times, positions = self._pending
+        self._pending = ([], [], [])
+        self.append(slots, times, positions)
+
+    def last_time(self, slot):
+        """
+        :param slot:
+        :return: Time of the most recent sample in the slot, or `None`.
+        """
+        return self.times[slot, self.head[slot]] if self.count[slot] else None
+
+    def stats(self, slots):
+        """
+        Computes the speed window statistics of the given slots.
+
+        :param slots: Sequence of slots
+        :return: Tuple of arrays `(velocity, displacement_velocity,
+                 displacement, dt)`, where `displacement` is an
+                 n x 3 array of displacement vectors.
+        """
+        slots = np.asarray(slots, dtype=int)
+        rows = np.arange(len(slots))
+        head = self.head[slots]
+
+        times = self.times[slots]
+        t_last = times[rows, head]
+
+        mask = self.valid[slots]
+        if self.window_time is not None:
+            mask &= times >= (t_last - self.window_time)[:, None]
+
+        first = np.argmin(np.where(mask, times, np.inf), axis=1)
+        dt = np.where(mask.any(axis=1), t_last - times[rows, first], 0.0)
+        dist = self.distance[slots, head] - self.distance[slots, first]
+        disp = self.positions[slots, head] - self.positions[slots, first]
+
+        safe_dt = np.where(dt > 0, dt, 1.0)
+        velocity = np.where(dt > 0, dist / safe_dt, 0.0)
+        dvel = np.where(dt > 0, np.linalg.norm(disp, axis=1) / safe_dt, 0.0)
+        return velocity, dvel, disp, dt
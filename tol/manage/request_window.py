@@ -0,0 +1,210 @@
+from __future__ import absolute_import
+import itertools
+import time
+import trollius
+from trollius import From, Return, Future
+
+from ..logging import logger
+from ..metrics import metrics
+
+REQUEST_LATENCY = metrics.histogram('tol_request_latency_seconds',
+                                    "Round trip time of simulator requests.", ('window', 'kind'))
+REQUEST_TIMEOUTS = metrics.counter('tol_request_timeouts_total',
+                                   "Number of timed out simulator requests.", ('window', 'kind'))
+REQUEST_FAILURES = metrics.counter('tol_request_failures_total',
+                                   "Number of failed simulator requests.", ('window', 'kind'))
+REQUESTS_IN_FLIGHT = metrics.gauge('tol_requests_in_flight',
+                                   "Number of requests awaiting their response.", ('window',))
+
+
+class LatencyStats(object):
+    """
+    Keeps simple latency statistics for a single request type.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+        self.timeouts = 0
+        self.retries = 0
+        self.failures = 0
+
+    def add(self, latency):
+        """
+        Registers the round trip time of a completed request.
+        :param latency: Latency in seconds
+        :type latency: float
+        :return:
+        """
+        self.count += 1
+        self.total += latency
+        self.min = latency if self.min is None else min(self.min, latency)
+        self.max = latency if self.max is None else max(self.max, latency)
+
+    def mean(self):
+        """
+        :return: Mean latency in seconds, or zero if nothing was recorded.
+        """
+        return self.total / self.count if self.count else 0.0
+
+    def __repr__(self):
+        return "<LatencyStats n=%d mean=%.4f max=%.4f timeouts=%d retries=%d>" % (
+            self.count, self.mean(), self.max or 0.0, self.timeouts, self.retries)
+
+
+class RequestWindow(object):
+    """
+    Multiplexes requests to the simulator using a bounded window of
+    in-flight requests.
+
+    Sending is still done strictly one message at a time (see the
+    remarks in `World`), but contrary to `wait_for` this class does not
+    wait for the response of a request before the next one is sent.
+    Only when `size` requests are awaiting their response does
+    `submit` block until a slot frees up.
+
+    Every request is given a correlation ID, is timed out after
+    `timeout` seconds (when set) and resent up to `retries` times.
+    Round trip latencies are recorded per request type, and exported
+    as metrics if the window has a name. The number of in-flight
+    requests is only exported after `register_metrics` is called.
+    """
+
+    def __init__(self, size=8, timeout=None, retries=0, name=None):
+        """
+        :param size: Maximum number of concurrent in-flight requests
+        :type size: int
+        :param timeout: Response timeout in seconds, `None` or 0 to wait forever
+        :type timeout: float
+        :param retries: Default number of times a timed out request is resent
+        :type retries: int
+        :param name: Name of the window in the exported metrics
+        :type name: str
+        :return:
+        """
+        self.size = max(1, size)
+        self.timeout = timeout or None
+        self.retries = retries
+        self.name = name
+        self.latency = {}
+
+        # Correlation ID => (request type, send time)
+        self.in_flight = {}
+
+        self._ids = itertools.count(1)
+        self._semaphore = trollius.Semaphore(self.size)
+        self._send_lock = trollius.Lock()
+
+    def register_metrics(self):
+        """
+        Exports the number of in-flight requests of this window.
+        :return:
+        """
+        if self.name:
+            REQUESTS_IN_FLIGHT.labels(window=self.name).set_function(lambda: len(self.in_flight))
+
+    def stats(self, kind):
+        """
+        :param kind: Request type
+        :return: The latency statistics for the given request type
+        :rtype: LatencyStats
+        """
+        if kind not in self.latency:
+            self.latency[kind] = LatencyStats()
+
+        return self.latency[kind]
+
+    @trollius.coroutine
+    def submit(self, kind, factory, retries=None, timeout=None):
+        """
+        Submits a request to the window.
+
+        :param kind: Request type, used to group latency statistics.
+        :type kind: str
+        :param factory: Callable without arguments returning a coroutine
+                        that sends the request and returns the response
+                        future, i.e. the convention used by `World` methods
+                        such as `insert_model` and `delete_robot`. The factory
+                        is called again for every retry.
+        :param retries: Overrides the default number of retries
+        :param timeout: Overrides the default timeout
+        :return: Future that resolves when the request has been sent; it
+                 returns a future that resolves with the response.
+        """
+        retries = self.retries if retries is None else retries
+        timeout = self.timeout if timeout is None else (timeout or None)
+
+        yield From(self._semaphore.acquire())
+        corr_id = next(self._ids)
+
+        try:
+            response = yield From(self._send(kind, corr_id, factory))
+        except Exception:
+            self.in_flight.pop(corr_id, None)
+            self._semaphore.release()
+            raise
+
+        result = Future()
+        trollius.Task(self._track(kind, corr_id, factory, response, result, retries, timeout))
+        raise Return(result)
+
+    @trollius.coroutine
+    def _send(self, kind, corr_id, factory):
+        """
+        Sends a single request, making sure only one message
+        is being sent at a time.
+        """
+        with (yield From(self._send_lock)):
+            self.in_flight[corr_id] = (kind, time.time())
+            response = yield From(factory())
+
+        raise Return(response)
+
+    @trollius.coroutine
+    def _track(self, kind, corr_id, factory, response, result, retries, timeout):
+        """
+        Waits for the response of a sent request, resending it
+        on timeout if retries remain.
+        """
+        stats = self.stats(kind)
+
+        try:
+            while True:
+                try:
+                    # Shield the response future, the request handler
+                    # still resolves it when a late response arrives.
+                    value = yield From(trollius.wait_for(trollius.shield(response), timeout))
+                except trollius.TimeoutError:
+                    stats.timeouts += 1
+                    if self.name:
+                        REQUEST_TIMEOUTS.labels(window=self.name, kind=kind).inc()
+
+                    if retries <= 0:
+                        raise
+
+                    retries -= 1
+                    stats.retries += 1
+                    logger.warning("Request %d (%s) timed out, resending..." % (corr_id, kind))
+                    response = yield From(self._send(kind, corr_id, factory))
+                    continue
+
+                latency = time.time() - self.in_flight[corr_id][1]
+                stats.add(latency)
+                if self.name:
+                    REQUEST_LATENCY.labels(window=self.name, kind=kind).observe(latency)
+
+                if not result.done():
+                    result.set_result(value)
+                break
+        except Exception as e:
+            stats.failures += 1
+            if self.name:
+                REQUEST_FAILURES.labels(window=self.name, kind=kind).inc()
+
+            if not result.done():
+                result.set_exception(e)
+        finally:
+            self.in_flight.pop(corr_id, None)
+            self._semaphore.release()
@@ -1,14 +1,121 @@
+import numpy as np
 from sdfbuilder.math import Vector3
 from revolve.util import Time
-from revolve.angle import Robot as RvRobot
-from ..util.analyze import count_joints, count_motors, count_connections, count_extremities
+from revolve.angle import Robot as RvRobot, Tree
+from revolve.spec import Robot as ProtoRobot
+from ..util.analyze import Morphology
+
+
+def compute_fitness(conf, age, size, velocity, dvel):
+    """
+    Computes the fitness function described in `Robot.fitness`, either
+    for a single robot or element wise for arrays of robot statistics.
+
+    :param conf:
+    :param age: Robot age(s) in seconds
+    :param size: Robot size(s)
+    :param velocity: Speed window velocity
+    :param dvel: Speed window displacement velocity
+    :return:
+    """
+    age, size = np.asarray(age, dtype=float), np.asarray(size, dtype=float)
+    d = 1.0 - (conf.fitness_size_discount * size)
+    v = d * (conf.fitness_displacement_factor * np.asarray(dvel) +
+             conf.fitness_velocity_factor * np.asarray(velocity) +
+             conf.fitness_size_factor * size)
+
+    # We want at least some data, and unrealistic values
+    # are attributed to simulator instabilities.
+    v = np.where(v <= conf.fitness_limit, v, 0.0)
+    return np.where((age < 0.25 * conf.evaluation_time) | (age < conf.warmup_time), 0.0, v)
+
+
+def optimistic_fitness(conf, size, velocity, dvel, elapsed, speed_bound):
+    """
+    Returns an optimistic estimate of the fitness a robot reaches at the
+    end of its evaluation, given its speed window statistics after
+    `elapsed` seconds of the evaluation time. For the remaining time the
+    robot is assumed to move at `speed_bound`, or at its current velocity
+    if that is higher. This is a heuristic rather than an upper bound: a
+    robot can still move faster than assumed, and the speed window does
+    not weigh all samples equally. The estimate assumes non-negative
+    fitness factors.
+
+    :param conf:
+    :param size: Robot size
+    :param velocity: Current speed window velocity
+    :param dvel: Current speed window displacement velocity
+    :param elapsed: Seconds of the speed window that have passed
+    :param speed_bound: Optimistic velocity over the remaining time
+    :return:
+    """
+    total = float(conf.evaluation_time)
+    remaining = max(0.0, total - elapsed)
+    speed = max(speed_bound, velocity)
+    v = (velocity * elapsed + speed * remaining) / total
+    dv = (dvel * elapsed + speed * remaining) / total
+    d = 1.0 - (conf.fitness_size_discount * size)
+    return d * (conf.fitness_displacement_factor * dv +
+                conf.fitness_velocity_factor * v +
+                conf.fitness_size_factor * size)
+
+
+def write_robot(robot, world, details_file, csv_writer):
+    """
+    Writes the protobuf of a `Robot` or `EvaluationRecord` to the world's
+    robot pack if it has one, or to `details_file` otherwise, and its
+    row to the robots CSV file. The position columns are left empty for
+    robots without a known position.
+
+    :param robot:
+    :param world:
+    :param details_file:
+    :param csv_writer:
+    :return:
+    """
+    pack = getattr(world, 'robot_pack', None)
+    if pack:
+        pack.write(robot.robot.id, robot.robot.SerializeToString())
+    else:
+        with open(details_file, 'w') as f:
+            f.write(robot.robot.SerializeToString())
+
+    row = [getattr(world, 'current_run', 0), robot.robot.id,
+           world.age()]
+    row += list(robot.parent_ids) if robot.parent_ids else ['', '']
+    pos = robot.last_position
+    row += [robot.size] + ([pos.x, pos.y, pos.z] if pos is not None else ['', '', ''])
+
+    m = robot.morphology
+    row += [m.extremity_count, m.joint_count, m.motor_count,
+            m.inputs, m.outputs, m.hidden, m.connections]
+
+    csv_writer.writerow(row)
 
 
 class Robot(RvRobot):
     """
     Class to manage a single robot
+
+    While a robot is in the world it is attached to a slot of the
+    world's `PoseStore`, which holds its speed window, and its speed
+    window statistics are read from there. When the robot is detached
+    the final statistics are kept on the robot.
     """
 
+    # Pose store and slot this robot is attached to, if any
+    pose_store = None
+    pose_slot = None
+
+    # Speed window statistics when the robot was last detached
+    final_stats = None
+
+    # (w, x, y, z) orientation quaternion of the last state update
+    last_orientation = None
+
+    # Whether the evaluation of this robot was stopped early
+    terminated = False
+
     def __init__(self, conf, name, tree, robot, position, time, battery_level=0.0, parents=None):
         """
         :param conf:
@@ -35,6 +142,7 @@ class Robot(RvRobot):
         self.last_mate = None
         self.conf = conf
         self.size = len(tree)
+        self.morphology = Morphology(tree)
         self.battery_level = battery_level
         self.initial_charge = battery_level
 
@@ -74,6 +182,101 @@ class Robot(RvRobot):
             (other_fitness / my_fitness) >= self.conf.mating_fitness_threshold
         )
 
+    def update_state(self, world, time, state, poses_file):
+        """
+        Records the position, orientation and time of a pose message.
+        The speed window is kept in the pose store rather than in the
+        Revolve robot, so outside the warmup time the sample is queued
+        on the store, which the world flushes after the message.
+        :param world:
+        :param time:
+        :param state:
+        :param poses_file:
+        :return:
+        """
+        pos = state.pose.position
+        rot = state.pose.orientation
+        if self.starting_time is None:
+            self.starting_time = time
+
+        self.last_update = time
+        self.last_position = Vector3(pos.x, pos.y, pos.z)
+        self.last_orientation = (rot.w, rot.x, rot.y, rot.z)
+
+        if poses_file:
+            age = world.age()
+            poses_file.writerow([self.robot.id, age.sec, age.nsec, pos.x, pos.y, pos.z])
+
+        if self.pose_store is not None and float(self.age()) >= self.conf.warmup_time:
+            self.pose_store.push(self.pose_slot, float(time), (pos.x, pos.y, pos.z))
+
+    def attach(self, store, slot):
+        """
+        Attaches this robot to a slot in a pose store.
+        :param store:
+        :type store: PoseStore
+        :param slot:
+        :return:
+        """
+        self.pose_store = store
+        self.pose_slot = slot
+
+    def detach(self):
+        """
+        Detaches this robot from its pose store, keeping its
+        final speed window statistics.
+        :return:
+        """
+        self.final_stats = self._stats()
+        self.pose_store = None
+        self.pose_slot = None
+
+    def __getstate__(self):
+        """
+        The pose store is not pickled along with the robot,
+        its current statistics are.
+        :return:
+        """
+        state = self.__dict__.copy()
+        state['final_stats'] = self._stats()
+        state.pop('pose_store', None)
+        state.pop('pose_slot', None)
+        return state
+
+    def _stats(self):
+        """
+        :return: Tuple `(velocity, displacement velocity, displacement,
+                 dt)` of speed window statistics from the pose store, the
+                 final statistics if the store has fewer than two samples
+                 or the robot is detached, or zeros before any of these.
+        """
+        store = self.pose_store
+        if store is not None and store.count[self.pose_slot] >= 2:
+            velocity, dvel, disp, dt = store.stats([self.pose_slot])
+            return float(velocity[0]), float(dvel[0]), tuple(disp[0]), float(dt[0])
+
+        return self.final_stats or (0.0, 0.0, (0.0, 0.0, 0.0), 0.0)
+
+    def velocity(self):
+        """
+        :return: Average velocity over the speed window
+        """
+        return self._stats()[0]
+
+    def displacement(self):
+        """
+        :return: Tuple of the displacement vector over the speed
+                 window and the time it took.
+        """
+        _, _, disp, dt = self._stats()
+        return Vector3(*disp), dt
+
+    def displacement_velocity(self):
+        """
+        :return: Velocity in a straight line over the speed window
+        """
+        return self._stats()[1]
+
     def distance_to(self, vec, planar=True):
         """
         Calculates the Euclidean distance from this robot to
@@ -100,26 +303,15 @@ class Robot(RvRobot):
 
     def write_robot(self, world, details_file, csv_writer):
         """
+        Writes the robot protobuf to the world's robot pack if it has
+        one, or to `details_file` otherwise.
+
         :param world:
         :param details_file:
         :param csv_writer:
         :return:
         """
-        with open(details_file, 'w') as f:
-            f.write(self.robot.SerializeToString())
-
-        row = [getattr(world, 'current_run', 0), self.robot.id,
-               world.age()]
-        row += list(self.parent_ids) if self.parent_ids else ['', '']
-        row += [self.size, self.last_position.x,
-                self.last_position.y, self.last_position.z]
-
-        root = self.tree.root
-        inputs, outputs, hidden = root.io_count(recursive=True)
-        row += [count_extremities(root), count_joints(root), count_motors(root),
-                inputs, outputs, hidden, count_connections(root)]
-
-        csv_writer.writerow(row)
+        write_robot(self, world, details_file, csv_writer)
 
     def fitness(self):
         """
@@ -142,12 +334,8 @@ class Robot(RvRobot):
             # We want at least some data
             return 0.0
 
-        v_fac = self.conf.fitness_velocity_factor
-        d_fac = self.conf.fitness_displacement_factor
-        s_fac = self.conf.fitness_size_factor
-        d = 1.0 - (self.conf.fitness_size_discount * self.size)
-        v = d * (d_fac * self.displacement_velocity() + v_fac * self.velocity() + s_fac * self.size)
-        return v if v <= self.conf.fitness_limit else 0.0
+        return float(compute_fitness(self.conf, float(age), self.size,
+                                     self.velocity(), self.displacement_velocity()))
 
     def is_evaluated(self):
         """
@@ -176,3 +364,107 @@ class Robot(RvRobot):
             self.mated_with[other.name] += 1
         else:
             self.mated_with[other.name] = 1
+
+
+class EvaluationRecord(object):
+    """
+    The result of evaluating a robot in offline evolution, without the
+    simulation state of a `Robot`. It is used in place of a robot that
+    is known from the fitness cache, and can be used as a parent.
+    """
+
+    # Records are not simulated, so they have no position
+    last_position = None
+
+    def __init__(self, conf, tree, robot, velocity, dvel, parents=None, evaluations=1):
+        """
+        :param conf:
+        :param tree:
+        :param robot: Protobuf robot
+        :param velocity: Average velocity over the speed window
+        :param dvel: Displacement velocity over the speed window
+        :param parents:
+        :type parents: tuple(Robot, Robot)
+        :param evaluations: Number of evaluations the velocities are averaged over
+        :return:
+        """
+        self.conf = conf
+        self.tree = tree
+        self.robot = robot
+        self.name = "robot_%d" % robot.id
+        self.size = len(tree)
+        self.morphology = Morphology(tree)
+        self.parent_ids = tuple(p.robot.id for p in parents) if parents else None
+        self.evaluations = evaluations
+        self.terminated = False
+        self._velocity = velocity
+        self._dvel = dvel
+
+    @classmethod
+    def from_robot(cls, robot):
+        """
+        :param robot: Evaluated robot
+        :type robot: Robot|EvaluationRecord
+        :return: Record of the given robot's evaluation
+        :rtype: EvaluationRecord
+        """
+        if isinstance(robot, cls):
+            return robot
+
+        record = cls(robot.conf, robot.tree, robot.robot, robot.velocity(),
+                     robot.displacement_velocity())
+        record.parent_ids = tuple(robot.parent_ids) if robot.parent_ids else None
+        record.terminated = robot.terminated
+        return record
+
+    @classmethod
+    def from_state(cls, conf, state, body_spec):
+        """
+        Rebuilds a record from the output of `state`.
+        :param conf:
+        :param state:
+        :param body_spec: Body specification to rebuild the tree with
+        :return:
+        :rtype: EvaluationRecord
+        """
+        data, velocity, dvel, evaluations, terminated, parent_ids = state
+        robot = ProtoRobot()
+        robot.ParseFromString(data)
+        tree = Tree.from_body_brain(robot.body, robot.brain, body_spec)
+
+        record = cls(conf, tree, robot, velocity, dvel, evaluations=evaluations)
+        record.parent_ids = parent_ids
+        record.terminated = terminated
+        return record
+
+    def state(self):
+        """
+        :return: Compact picklable state of this record, consisting of the
+                 serialized robot and its evaluation statistics.
+        """
+        return (self.robot.SerializeToString(), self._velocity, self._dvel,
+                self.evaluations, self.terminated, self.parent_ids)
+
+    def write_robot(self, world, details_file, csv_writer):
+        """
+        Writes the robot as `Robot.write_robot` does, without a position.
+        :param world:
+        :param details_file:
+        :param csv_writer:
+        :return:
+        """
+        write_robot(self, world, details_file, csv_writer)
+
+    def velocity(self):
+        return self._velocity
+
+    def displacement_velocity(self):
+        return self._dvel
+
+    def fitness(self):
+        """
+        :return: The fitness as in `Robot.fitness`, for a robot
+                 that has been fully evaluated.
+        """
+        age = self.conf.evaluation_time + self.conf.warmup_time
+        return float(compute_fitness(self.conf, age, self.size, self._velocity, self._dvel))
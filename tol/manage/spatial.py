@@ -0,0 +1,153 @@
+from __future__ import absolute_import
+import math
+
+
+class GridIndex(object):
+    """
+    Uniform grid over planar (x, y) positions, used for distance
+    queries on the robots in the world. Each key lives in exactly one
+    cell; moving a key only touches the grid when it crosses a cell
+    boundary.
+    """
+
+    def __init__(self, cell_size=1.0):
+        """
+        :param cell_size: Size of a grid cell in meters
+        :type cell_size: float
+        :return:
+        """
+        self.cell_size = float(cell_size)
+        self._cells = {}
+        self._positions = {}
+
+    def __len__(self):
+        return len(self._positions)
+
+    def __contains__(self, key):
+        return key in self._positions
+
+    def keys(self):
+        """
+        :return: Set of all indexed keys
+        """
+        return set(self._positions)
+
+    def _cell(self, x, y):
+        return int(math.floor(x / self.cell_size)), int(math.floor(y / self.cell_size))
+
+    def update(self, key, x, y):
+        """
+        Inserts a key or moves it to a new position.
+        :param key:
+        :param x:
+        :param y:
+        :return:
+        """
+        cell = self._cell(x, y)
+        old = self._positions.get(key)
+        self._positions[key] = (x, y, cell)
+
+        if old is not None:
+            if old[2] == cell:
+                return
+
+            self._remove_from_cell(key, old[2])
+
+        self._cells.setdefault(cell, set()).add(key)
+
+    def remove(self, key):
+        """
+        :param key:
+        :return:
+        """
+        old = self._positions.pop(key, None)
+        if old is not None:
+            self._remove_from_cell(key, old[2])
+
+    def _remove_from_cell(self, key, cell):
+        keys = self._cells[cell]
+        keys.discard(key)
+        if not keys:
+            del self._cells[cell]
+
+    def _ring(self, cx, cy, ring):
+        """
+        Yields the keys in the square ring of cells at Chebyshev
+        distance `ring` from cell (cx, cy).
+        """
+        if ring == 0:
+            for key in self._cells.get((cx, cy), ()):
+                yield key
+            return
+
+        for i in xrange(-ring, ring + 1):
+            for cell in ((cx + i, cy - ring), (cx + i, cy + ring)):
+                for key in self._cells.get(cell, ()):
+                    yield key
+
+        for j in xrange(-ring + 1, ring):
+            for cell in ((cx - ring, cy + j), (cx + ring, cy + j)):
+                for key in self._cells.get(cell, ()):
+                    yield key
+
+    def _distance(self, key, x, y):
+        px, py, _ = self._positions[key]
+        return math.sqrt((px - x) ** 2 + (py - y) ** 2)
+
+    def within(self, x, y, radius):
+        """
+        :param x:
+        :param y:
+        :param radius:
+        :return: List of `(distance, key)` tuples for all keys within
+                 `radius` of the given position, sorted by distance.
+        """
+        x0, y0 = self._cell(x - radius, y - radius)
+        x1, y1 = self._cell(x + radius, y + radius)
+
+        found = []
+        if (x1 - x0 + 1) * (y1 - y0 + 1) > len(self._cells):
+            # Sparse grid, checking every occupied cell is cheaper
+            cells = (k for (cx, cy), k in self._cells.items()
+                     if x0 <= cx <= x1 and y0 <= cy <= y1)
+        else:
+            cells = (self._cells.get((cx, cy), ()) for cx in xrange(x0, x1 + 1)
+                     for cy in xrange(y0, y1 + 1))
+
+        for keys in cells:
+            for key in keys:
+                d = self._distance(key, x, y)
+                if d <= radius:
+                    found.append((d, key))
+
+        found.sort()
+        return found
+
+    def nearest(self, x, y, k=1):
+        """
+        :param x:
+        :param y:
+        :param k:
+        :return: List of `(distance, key)` tuples for the `k` keys
+                 closest to the given position, sorted by distance.
+        """
+        if not self._positions or k <= 0:
+            return []
+
+        cx, cy = self._cell(x, y)
+        found = []
+        ring = 0
+
+        # Stop looking when all keys are found, or when the k-th best
+        # distance lies within the area that has been searched.
+        while len(found) < len(self._positions):
+            found.extend((self._distance(key, x, y), key) for key in self._ring(cx, cy, ring))
+            if len(found) >= k:
+                found.sort()
+                if found[k - 1][0] <= ring * self.cell_size:
+                    break
+
+            ring += 1
+
+        found.sort()
+        return found[:k]
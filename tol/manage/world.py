@@ -10,6 +10,7 @@ import itertools
 import csv
 import os
 from datetime import datetime
+import numpy as np
 
 # Pygazebo
 from pygazebo.msg import world_control_pb2, poses_stamped_pb2, world_stats_pb2, model_pb2
@@ -24,10 +25,21 @@ from sdfbuilder import SDF, Model, Pose, Link
 from ..config import constants, parser, str_to_address, make_revolve_config
 from ..build import get_builder, get_simulation_robot
 from ..spec import get_tree_generator
+from ..util.tree_hash import body_hash
+from ..util.local_analyzer import LocalBodyAnalyzer
+from ..util.profiling import Profiler
 from revolve.util import multi_future, wait_for
 from .robot import Robot
-from ..scenery import Wall, BirthClinic
+from .request_window import RequestWindow
+from .analysis_cache import AnalysisCache
+from .spatial import GridIndex
+from .pose_store import PoseStore
+from .pose_lag import PoseLagMonitor, FrequencyController
+from .fitness import FitnessSnapshot
+from ..scenery import Arena
 from ..logging import logger
+from ..output import OutputWriter, PoseLog, RobotPackWriter
+from ..metrics import metrics, HttpExporter, JsonLinesExporter
 
 # Construct a message base from the time. This should make
 # it unique enough for consecutive use when the script
@@ -35,6 +47,23 @@ from ..logging import logger
 _a = time.time()
 MSG_BASE = int(_a - 14e8 + (_a - int(_a)) * 1e5)
 
+# Wall clock seconds over which the real time factor is measured
+RTF_INTERVAL = 5.0
+
+RTF = metrics.gauge('tol_real_time_factor', "Simulation seconds per wall clock second.")
+ROBOT_COUNT = metrics.gauge('tol_robots', "Number of robots in the world.")
+OUTPUT_BACKLOG = metrics.gauge('tol_output_backlog', "Number of queued output file writes.")
+STATE_UPDATE_INTERVAL = metrics.histogram('tol_state_update_interval_seconds',
+                                          "Wall clock time between robot state updates.")
+POSE_LAG = metrics.gauge('tol_pose_lag_seconds',
+                         "Estimated delay of pose message processing, with adaptive"
+                         " pose frequency.")
+POSE_LAG_HISTOGRAM = metrics.histogram('tol_pose_lag_histogram_seconds',
+                                       "Distribution of the pose message processing delay,"
+                                       " with adaptive pose frequency.")
+POSE_UPDATE_FREQUENCY = metrics.gauge('tol_pose_update_frequency',
+                                      "Requested pose updates per simulation second.")
+
 
 class World(WorldManager):
     """
@@ -50,8 +79,18 @@ class World(WorldManager):
     to send multiple messages over the same channel, so a request
     is always sent until completion. The methods then return the
     future that resolves when the response is delivered.
+
+    Methods that send many requests at once (inserting a population,
+    building walls, deleting robots) go through `self.requests`, a
+    `RequestWindow` that keeps sending strictly sequential but allows
+    a bounded number of requests to await their response concurrently.
     """
 
+    # Methods that are timed when profiling is enabled
+    profiled_methods = ('_update_states', 'create_snapshot', 'generate_population',
+                        'analyze_tree', 'insert_robot', 'delete_robot', 'insert_population',
+                        'delete_robots', 'mate', 'pause')
+
     def __init__(self, conf, _private):
         """
 
@@ -82,6 +121,101 @@ class World(WorldManager):
         # but might in a more complicated yielding structure).
         self._reproducing = False
 
+        # Window of concurrent in-flight simulator requests
+        self.requests = RequestWindow(size=conf.max_inflight_requests,
+                                      timeout=conf.request_timeout,
+                                      retries=conf.request_retries,
+                                      name='requests')
+
+        # Grid of the last known robot positions, by robot name
+        self.positions = GridIndex(conf.spatial_cell_size)
+
+        # Lag of pose message processing, and the controller that
+        # adapts the pose update frequency to it if enabled.
+        self.pose_lag = PoseLagMonitor()
+        self.frequency_controller = None
+        max_frequency = conf.pose_update_frequency
+        if conf.adaptive_pose_frequency:
+            max_frequency = conf.max_pose_update_frequency or conf.pose_update_frequency
+            self.frequency_controller = FrequencyController(
+                conf.pose_update_frequency, min(conf.min_pose_update_frequency, max_frequency),
+                max_frequency, conf.target_pose_lag)
+
+        self._frequency_request = None
+        self.pose_update_frequency = conf.pose_update_frequency
+
+        # Speed window samples of all robots, and the robots
+        # attached to it by name. The window is a time window,
+        # the store fits it at the highest update frequency.
+        self.pose_store = PoseStore(int(conf.evaluation_time * max_frequency) + 1,
+                                    window_time=conf.evaluation_time)
+        self._stored_robots = {}
+
+        # Fitness snapshot of the current state update
+        self._fitness_snapshot = None
+
+        # Analyze bodies in process if requested or if there is no
+        # external analyzer to use.
+        self.local_analyzer = None
+        if conf.local_analyzer or not str_to_address(conf.analyzer_address):
+            self.local_analyzer = LocalBodyAnalyzer(self.builder, conf)
+
+        # Background writer for experiment output files
+        self.output = OutputWriter(flush_interval=conf.output_flush_interval,
+                                   durability=conf.output_durability,
+                                   queue_size=conf.output_queue_size)
+
+        # Output file sizes at the time of the restored snapshot
+        marks = self.do_restore.get('output_marks', {}) if self.do_restore else {}
+
+        # Binary log of all robot poses
+        self.pose_log = None
+        self._logged_times = {}
+        if conf.pose_log and self.output_directory:
+            self.pose_log = PoseLog(self.output, os.path.join(self.output_directory, "poses.bin"),
+                                    orientation=conf.pose_log_orientation,
+                                    flush_interval=conf.output_flush_interval,
+                                    restore=bool(self.do_restore), offset=marks.get('poses'))
+
+        # Pack file for robot protobufs
+        self.robot_pack = None
+        if conf.robot_pack and self.output_directory:
+            self.robot_pack = RobotPackWriter(self.output, self.output_directory,
+                                              restore=bool(self.do_restore),
+                                              entries=marks.get('robot_pack'))
+
+        # Cache of body analyzer results
+        self.analysis_cache = None
+        if conf.analyzer_cache_size > 0:
+            cache_file = None
+            if conf.persist_analyzer_cache and self.output_directory:
+                cache_file = os.path.join(self.output_directory, "analyzer_cache.pickle")
+
+            self.analysis_cache = AnalysisCache(conf.analyzer_cache_size, cache_file)
+
+        # Runtime metrics, see `tol.metrics`. Only exported by the
+        # world that calls `register_metrics`, so evaluation pool
+        # workers do not overwrite the values of their master.
+        self.metrics_registered = False
+        self._last_state_update = None
+        self._rtf_start = None
+
+        self.metrics_exporters = []
+        if conf.metrics_port:
+            self.metrics_exporters.append(HttpExporter(metrics, conf.metrics_port))
+
+        if conf.metrics_file and self.output_directory:
+            self.metrics_exporters.append(JsonLinesExporter(
+                metrics, os.path.join(self.output_directory, conf.metrics_file),
+                interval=conf.metrics_interval))
+
+        # Wrap the profiled methods on this instance only, so they run
+        # unmodified when profiling is off.
+        self.profiler = None
+        if conf.profile:
+            self.profiler = Profiler()
+            self.profiler.instrument(self, self.profiled_methods)
+
         # Write settings to config file
         if self.output_directory:
             parser.write_to_file(conf, os.path.join(self.output_directory, "settings.conf"))
@@ -98,6 +232,352 @@ class World(WorldManager):
         yield From(self._init())
         raise Return(self)
 
+    @trollius.coroutine
+    def _init(self):
+        """
+        With adaptive pose frequency, also subscribes to the world
+        statistics, which are used to measure the pose lag.
+        :return:
+        """
+        yield From(super(World, self)._init())
+        if not self.frequency_controller:
+            return
+
+        self._world_stats_subscriber = self.manager.subscribe(
+            '/gazebo/default/world_stats', 'gazebo.msgs.WorldStatistics', self._update_world_stats)
+        yield From(self._world_stats_subscriber.wait_for_connection())
+
+    @trollius.coroutine
+    def create_snapshot(self):
+        """
+        Also persists the analyzer cache with the snapshot.
+        :return:
+        """
+        ret = yield From(super(World, self).create_snapshot())
+        if ret and self.analysis_cache:
+            self.analysis_cache.save()
+
+        raise Return(ret)
+
+    @trollius.coroutine
+    def get_snapshot_data(self):
+        """
+        Also stores the current size of the output files, which
+        are truncated back to this size on restore.
+        :return:
+        """
+        data = yield From(super(World, self).get_snapshot_data())
+
+        marks = {}
+        if self.pose_log:
+            marks['poses'] = self.pose_log.mark()
+
+        if self.robot_pack:
+            marks['robot_pack'] = self.robot_pack.mark()
+
+        self.output.flush_and_mark()
+        data['output_marks'] = marks
+        raise Return(data)
+
+    @trollius.coroutine
+    def teardown(self):
+        """
+        :return:
+        """
+        yield From(super(World, self).teardown())
+        self.close_outputs()
+
+    def close_outputs(self):
+        """
+        Closes the output files, the output writer and the metrics
+        exporters of this world, also when it never connected.
+        :return:
+        """
+        if self.analysis_cache:
+            self.analysis_cache.save()
+
+        if self.pose_log:
+            self.pose_log.close()
+
+        if self.robot_pack:
+            self.robot_pack.close()
+
+        self.output.close()
+
+        for exporter in self.metrics_exporters:
+            exporter.close()
+
+        if self.profiler:
+            self.write_profile()
+
+    def write_profile(self):
+        """
+        Writes the collapsed stacks of the profiler to `profile.folded`
+        in the output directory, and logs the most expensive call paths.
+        :return:
+        """
+        if self.output_directory:
+            self.profiler.dump(os.path.join(self.output_directory, "profile.folded"))
+
+        for path, calls, self_time, await_time in self.profiler.summary()[:20]:
+            logger.info("%-60s %8d calls %10.3fs self %10.3fs awaited" % (
+                path, calls, self_time, await_time))
+
+    def register_metrics(self):
+        """
+        Binds the runtime metrics to this world.
+        :return:
+        """
+        self.metrics_registered = True
+        ROBOT_COUNT.set_function(lambda: len(self.robots))
+        OUTPUT_BACKLOG.set_function(self.output.backlog)
+        POSE_UPDATE_FREQUENCY.set_function(lambda: self.pose_update_frequency)
+        self.requests.register_metrics()
+
+    def _update_states(self, msg):
+        """
+        Also updates the position index after the robot states
+        have been updated.
+        :param msg:
+        :return:
+        """
+        super(World, self)._update_states(msg)
+        self._sync_positions()
+        self._sync_pose_store()
+        self._log_poses()
+        self._update_metrics()
+        self._fitness_snapshot = None
+
+    def _update_metrics(self):
+        """
+        Records the wall clock time between state updates and, every
+        few seconds, the real time factor. With adaptive pose frequency,
+        also measures the pose lag and adapts the frequency.
+        :return:
+        """
+        now = time.time()
+        if self._last_state_update is not None and self.metrics_registered:
+            STATE_UPDATE_INTERVAL.observe(now - self._last_state_update)
+
+        self._last_state_update = now
+        if self.last_time is None:
+            return
+
+        sim_time = float(self.last_time)
+        if self.frequency_controller:
+            lag = self.pose_lag.update(now, sim_time)
+            if self.metrics_registered:
+                POSE_LAG.set(lag)
+                POSE_LAG_HISTOGRAM.observe(lag)
+
+            if self._frequency_request is None:
+                frequency = self.frequency_controller.update(now, lag)
+                if frequency is not None:
+                    self._frequency_request = trollius.Task(self._change_pose_frequency(frequency))
+
+        if self._rtf_start is None or sim_time < self._rtf_start[1]:
+            self._rtf_start = (now, sim_time)
+        elif now - self._rtf_start[0] >= RTF_INTERVAL:
+            if self.metrics_registered:
+                RTF.set((sim_time - self._rtf_start[1]) / (now - self._rtf_start[0]))
+            self._rtf_start = (now, sim_time)
+
+    def _sync_positions(self):
+        """
+        Moves every robot in the position index to its last known
+        position, and removes robots that are no longer in the world.
+        :return:
+        """
+        for name in self.positions.keys() - set(self.robots):
+            self.positions.remove(name)
+
+        for name, robot in self.robots.iteritems():
+            pos = robot.last_position
+            if pos is not None:
+                self.positions.update(name, pos.x, pos.y)
+
+    def _sync_pose_store(self):
+        """
+        Writes the samples the robots queued while handling the pose
+        message in one batch, then detaches the robots that have left
+        the world and releases their slots. Robots are attached when
+        they are created, robots restored from a snapshot are attached
+        here.
+        :return:
+        """
+        store = self.pose_store
+        store.flush()
+
+        for name in set(self._stored_robots) - set(self.robots):
+            robot = self._stored_robots.pop(name)
+            slot = robot.pose_slot
+            robot.detach()
+            store.release(slot)
+
+        for name, robot in self.robots.iteritems():
+            if robot.pose_slot is None:
+                self._attach(name, robot)
+
+    def _attach(self, name, robot):
+        """
+        Attaches a robot to a free slot of the pose store.
+        :param name:
+        :param robot:
+        :return:
+        """
+        robot.attach(self.pose_store, self.pose_store.allocate())
+        self._stored_robots[name] = robot
+
+    def _log_poses(self):
+        """
+        Appends the poses of the robots that were updated since
+        the last call to the binary pose log.
+        :return:
+        """
+        if not self.pose_log:
+            return
+
+        orientation = self.pose_log.orientation
+        logged = self._logged_times
+        records = []
+        for name, robot in self.robots.iteritems():
+            pos, t = robot.last_position, robot.last_update
+            if pos is None or t is None or logged.get(name) == t:
+                continue
+
+            logged[name] = t
+            record = (robot.robot.id, t.sec, t.nsec, pos.x, pos.y, pos.z)
+            if orientation:
+                record += robot.last_orientation or (1.0, 0.0, 0.0, 0.0)
+
+            records.append(record)
+
+        for name in set(logged) - set(self.robots):
+            del logged[name]
+
+        self.pose_log.append(records)
+
+    @trollius.coroutine
+    def _change_pose_frequency(self, frequency):
+        """
+        Changes the robot state update frequency on behalf of the
+        frequency controller. The pose store window is a time window,
+        so it remains valid.
+        :param frequency: Updates per simulation second
+        :return:
+        """
+        logger.info("Changing pose update frequency to %.2f" % frequency)
+        try:
+            yield From(wait_for(self.set_state_update_frequency(frequency)))
+            self.pose_update_frequency = frequency
+        finally:
+            self._frequency_request = None
+
+    def _update_world_stats(self, data):
+        """
+        Handles a world statistics message, used to measure the pose lag.
+        :param data:
+        :return:
+        """
+        msg = world_stats_pb2.WorldStatistics()
+        msg.ParseFromString(data)
+        self.pose_lag.world_stats(time.time(),
+                                  msg.sim_time.sec + 1e-9 * msg.sim_time.nsec,
+                                  msg.real_time.sec + 1e-9 * msg.real_time.nsec)
+
+    def population_stats(self, robots):
+        """
+        Computes the speed window statistics of the given robots in
+        one pass over the pose store.
+        :param robots:
+        :type robots: list[Robot]
+        :return: Tuple of arrays `(velocity, displacement_velocity,
+                 displacement, dt)`, see `PoseStore.stats`.
+        """
+        stored = [i for i, r in enumerate(robots)
+                  if r.pose_store is self.pose_store and self.pose_store.count[r.pose_slot] >= 2]
+
+        n = len(robots)
+        velocity, dvel, disp, dt = np.zeros(n), np.zeros(n), np.zeros((n, 3)), np.zeros(n)
+        if stored:
+            stats = self.pose_store.stats([robots[i].pose_slot for i in stored])
+            for arr, values in itertools.izip((velocity, dvel, disp, dt), stats):
+                arr[stored] = values
+
+        # Robots that are not (yet) in the store
+        for i in set(xrange(n)) - set(stored):
+            ds, t = robots[i].displacement()
+            velocity[i] = robots[i].velocity()
+            dvel[i] = robots[i].displacement_velocity()
+            disp[i] = (ds.x, ds.y, ds.z)
+            dt[i] = float(t)
+
+        return velocity, dvel, disp, dt
+
+    def fitness_snapshot(self):
+        """
+        Returns the fitness snapshot of all robots in the world. The snapshot
+        is reused until the next state update, or until robots are
+        inserted or removed.
+        :return:
+        :rtype: FitnessSnapshot
+        """
+        snapshot = self._fitness_snapshot
+        if snapshot is None or snapshot.names != frozenset(self.robots):
+            snapshot = FitnessSnapshot.create(self, self.robots.values())
+            self._fitness_snapshot = snapshot
+
+        return snapshot
+
+    def robots_within(self, position, radius):
+        """
+        :param position:
+        :type position: Vector3
+        :param radius: Planar distance in meters
+        :return: List of robots within the given planar distance
+                 of `position`, closest first.
+        """
+        self._check_positions()
+        return [self.robots[name] for _, name in
+                self.positions.within(position.x, position.y, radius) if name in self.robots]
+
+    def nearest(self, position, k=1):
+        """
+        :param position:
+        :type position: Vector3
+        :param k:
+        :return: List of the `k` robots closest to `position`
+                 in the plane, closest first.
+        """
+        self._check_positions()
+        robots = self.robots
+        stale = len(self.positions) - len(robots)
+        found = [robots[name] for _, name in
+                 self.positions.nearest(position.x, position.y, k + max(0, stale)) if name in robots]
+        return found[:k]
+
+    def _check_positions(self):
+        """
+        Robots are indexed when they are created and removed on the next
+        state update after their deletion, so the index can only lack
+        robots that were restored from a snapshot.
+        :return:
+        """
+        if len(self.positions) < len(self.robots):
+            self._sync_positions()
+
+    def mating_candidates(self, robot):
+        """
+        :param robot:
+        :type robot: Robot
+        :return: List of robots the given robot is willing to mate with
+                 and that are willing to mate with it, only robots within
+                 the mating distance are considered.
+        """
+        return [other for other in
+                self.robots_within(robot.last_position, self.conf.mating_distance_threshold)
+                if other is not robot and robot.will_mate_with(other) and other.will_mate_with(robot)]
+
     def robots_header(self):
         """
         Extends the robots header with a max age
@@ -117,8 +597,11 @@ class World(WorldManager):
         :param parents:
         :return:
         """
-        return Robot(self.conf, robot_name, tree, robot, position, t,
-                     battery_level=battery_level, parents=parents)
+        self.positions.update(robot_name, position.x, position.y)
+        manager = Robot(self.conf, robot_name, tree, robot, position, t,
+                        battery_level=battery_level, parents=parents)
+        self._attach(robot_name, manager)
+        return manager
 
     @trollius.coroutine
     def add_highlight(self, position, color):
@@ -160,6 +643,44 @@ class World(WorldManager):
 
         raise Return(trees, bboxes)
 
+    @trollius.coroutine
+    def analyze_tree(self, tree):
+        """
+        Analyzes the given tree, skipping the analyzer round trip
+        if a tree with the same body was analyzed before.
+        :param tree:
+        :type tree: Tree
+        :return: Future with the analysis result
+        """
+        if not self.analysis_cache:
+            ret = yield From(self._analyze_uncached(tree))
+            raise Return(ret)
+
+        key = body_hash(tree)
+        ret = self.analysis_cache.get(key)
+        if ret is not None:
+            raise Return(ret)
+
+        ret = yield From(self._analyze_uncached(tree))
+        if ret is not None:
+            self.analysis_cache.put(key, ret)
+
+        raise Return(ret)
+
+    @trollius.coroutine
+    def _analyze_uncached(self, tree):
+        """
+        Analyzes the given tree with the local analyzer if there is
+        one, or the external body analyzer otherwise.
+        :param tree:
+        :return:
+        """
+        if self.local_analyzer:
+            raise Return(self.local_analyzer.analyze_tree(tree))
+
+        ret = yield From(super(World, self).analyze_tree(tree))
+        raise Return(ret)
+
     @trollius.coroutine
     def insert_population(self, trees, poses):
         """
@@ -169,9 +690,12 @@ class World(WorldManager):
         :type poses: list[Pose]
         :return:
         """
+        # Inserts are not resent on timeout: the robot would be inserted
+        # a second time if the first request turns out to have succeeded.
         futures = []
         for tree, pose in itertools.izip(trees, poses):
-            future = yield From(self.insert_robot(tree, pose))
+            future = yield From(self.requests.submit(
+                'insert_robot', lambda t=tree, p=pose: self.insert_robot(t, p), retries=0))
             futures.append(future)
 
         future = multi_future(futures)
@@ -195,32 +719,55 @@ class World(WorldManager):
         :param points:
         :return: Future that resolves when all walls have been inserted.
         """
+        future = yield From(self.insert_arena(points))
+        raise Return(future)
+
+    @trollius.coroutine
+    def insert_arena(self, points, birth_clinic_diameter=None):
+        """
+        Inserts the arena walls defined by the given points, and
+        optionally a birth clinic, as a single static model.
+        :param points:
+        :param birth_clinic_diameter:
+        :return: Future that resolves when the arena has been inserted.
+        """
+        arena = Arena(points, constants.WALL_THICKNESS, constants.WALL_HEIGHT,
+                      birth_clinic_diameter=birth_clinic_diameter)
+        future = yield From(self.requests.submit(
+            'insert_model', lambda: self.insert_model(SDF(elements=[arena]))))
+        raise Return(future)
+
+    @trollius.coroutine
+    def delete_robots(self, robots):
+        """
+        Deletes all of the given robots.
+        :param robots:
+        :type robots: list[Robot]
+        :return: Future that resolves when all robots have been deleted.
+        """
+        # Like inserts, deletes are not resent on timeout: a delete that
+        # was applied late would unregister the robot a second time.
         futures = []
-        l = len(points)
-        for i in range(l):
-            start = points[i]
-            end = points[(i + 1) % l]
-            wall = Wall("wall_%d" % i, start, end, constants.WALL_THICKNESS, constants.WALL_HEIGHT)
-            future = yield From(self.insert_model(SDF(elements=[wall])))
+        for robot in robots:
+            future = yield From(self.requests.submit(
+                'delete_robot', lambda r=robot: self.delete_robot(r), retries=0))
             futures.append(future)
 
         raise Return(multi_future(futures))
 
-    @trollius.coroutine
-    def attempt_mate(self, ra, rb):
+    def create_child(self, ra, rb):
         """
-        Attempts mating between two robots.
+        Creates a candidate child of two robots through crossover
+        and mutation, without analyzing its body.
         :param ra:
         :param rb:
-        :return:
+        :return: The child tree, or `None` if no valid child could be created.
         """
-        logger.debug("Attempting mating between `%s` and `%s`..." % (ra.name, rb.name))
-
         # Attempt to create a child through crossover
         success, child = self.crossover.crossover(ra.tree, rb.tree)
         if not success:
             logger.debug("Crossover failed.")
-            raise Return(False)
+            return None
 
         # Apply mutation
         logger.debug("Crossover succeeded, applying mutation...")
@@ -232,6 +779,21 @@ class World(WorldManager):
         _, outputs, _ = child.root.io_count(recursive=True)
         if not outputs:
             logger.debug("Evolution resulted in child without motors.")
+            return None
+
+        return child
+
+    @trollius.coroutine
+    def attempt_mate(self, ra, rb):
+        """
+        Attempts mating between two robots.
+        :param ra:
+        :param rb:
+        :return:
+        """
+        logger.debug("Attempting mating between `%s` and `%s`..." % (ra.name, rb.name))
+        child = self.create_child(ra, rb)
+        if child is None:
             raise Return(False)
 
         # Check if the robot body is valid
@@ -243,6 +805,51 @@ class World(WorldManager):
         logger.debug("Viable child created.")
         raise Return(child, ret[1])
 
+    @trollius.coroutine
+    def mate(self, ra, rb):
+        """
+        Makes up to `max_mating_attempts` attempts at creating a viable
+        child of two robots. With `speculative_mating` set to K > 1, the
+        attempts are made in rounds of K candidate children that are
+        created together and then analyzed one after the other, the
+        first viable one is used. The body analyzer handles a single
+        request at a time, so this does not make mating faster.
+        :param ra:
+        :param rb:
+        :return: Tuple of child tree and bounding box, or False if no
+                 viable child was created.
+        """
+        attempts = self.conf.max_mating_attempts
+        k = max(1, self.conf.speculative_mating)
+
+        if k == 1:
+            for _ in xrange(attempts):
+                pair = yield From(self.attempt_mate(ra, rb))
+                if pair:
+                    raise Return(pair)
+
+            raise Return(False)
+
+        while attempts > 0:
+            n = min(k, attempts)
+            attempts -= n
+
+            logger.debug("Attempting %d speculative matings between `%s` and `%s`..." % (
+                n, ra.name, rb.name))
+            children = [c for c in (self.create_child(ra, rb) for _ in xrange(n)) if c is not None]
+            if not children:
+                continue
+
+            for child in children:
+                ret = yield From(self.analyze_tree(child))
+                if ret is not None and not ret[0]:
+                    logger.debug("Viable child created.")
+                    raise Return(child, ret[1])
+
+            logger.debug("Intersecting body parts: Miscarriage.")
+
+        raise Return(False)
+
 
 class Highlight(Model):
     """
@@ -0,0 +1,2 @@
+from .registry import metrics, Registry, Counter, Gauge, Histogram
+from .exporters import HttpExporter, JsonLinesExporter, to_text, to_dict
@@ -0,0 +1,126 @@
+from __future__ import absolute_import
+import json
+import threading
+import time
+from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+
+from ..logging import logger
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+
+    return '{%s}' % ','.join('%s="%s"' % (k, str(v).replace('\\', '\\\\').replace('"', '\\"'))
+                             for k, v in sorted(labels.items()))
+
+
+def to_text(registry):
+    """
+    :param registry:
+    :type registry: Registry
+    :return: The metrics in the registry in the Prometheus text format
+    """
+    lines = []
+    for metric in registry.metrics():
+        lines.append('# HELP %s %s' % (metric.name, metric.help))
+        lines.append('# TYPE %s %s' % (metric.name, metric.type))
+        for suffix, labels, value in metric.samples():
+            lines.append('%s%s%s %r' % (metric.name, suffix, _format_labels(labels), float(value)))
+
+    return '\n'.join(lines) + '\n'
+
+
+def to_dict(registry):
+    """
+    :param registry:
+    :type registry: Registry
+    :return: Dictionary of sample name => value, where the sample name
+             includes its labels like in the text format.
+    """
+    return {metric.name + suffix + _format_labels(labels): value
+            for metric in registry.metrics()
+            for suffix, labels, value in metric.samples()}
+
+
+class HttpExporter(object):
+    """
+    Serves the metrics in the Prometheus text format over HTTP,
+    from a background thread.
+    """
+
+    def __init__(self, registry, port, host='127.0.0.1'):
+        """
+        :param registry:
+        :type registry: Registry
+        :param port:
+        :param host:
+        :return:
+        """
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                body = to_text(registry)
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = HTTPServer((host, port), Handler)
+        self._thread = threading.Thread(target=self.server.serve_forever, name="tol-metrics-http")
+        self._thread.daemon = True
+        self._thread.start()
+        logger.info("Serving metrics on http://%s:%d/" % (host, port))
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class JsonLinesExporter(object):
+    """
+    Appends a JSON object with the current value of all metrics to
+    a file every `interval` seconds, from a background thread.
+    """
+
+    def __init__(self, registry, filename, interval=10.0):
+        """
+        :param registry:
+        :type registry: Registry
+        :param filename:
+        :param interval: Seconds between exports
+        :return:
+        """
+        self.registry = registry
+        self.interval = interval
+        self.file = open(filename, 'a')
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="tol-metrics-file")
+        self._thread.daemon = True
+        self._thread.start()
+
+    def export(self):
+        """
+        Writes the current values of all metrics.
+        :return:
+        """
+        data = to_dict(self.registry)
+        data['time'] = time.time()
+        self.file.write(json.dumps(data, sort_keys=True) + '\n')
+        self.file.flush()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.export()
+            except Exception:
+                logger.exception("Error exporting metrics.")
+
+    def close(self):
+        self._stop.set()
+        self._thread.join()
+        self.export()
+        self.file.close()
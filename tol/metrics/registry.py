@@ -0,0 +1,193 @@
+from __future__ import absolute_import
+import bisect
+import threading
+
+# Default histogram buckets, in seconds
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Metric(object):
+    """
+    Base class of a metric family. A metric without label names has a
+    single value; otherwise a child metric is kept for every combination
+    of label values, see `labels`. By default a metric exports its
+    `value` as a single sample.
+    """
+    type = None
+    value = 0.0
+
+    def __init__(self, name, help, label_names=()):
+        """
+        :param name:
+        :param help: Description of the metric
+        :param label_names: Names of the labels of this metric
+        :return:
+        """
+        self.name = name
+        self.help = help
+        self.label_names = tuple(label_names)
+        self._children = {}
+        self._lock = threading.Lock()
+
+    def labels(self, **labels):
+        """
+        :return: The child metric for the given label values
+        """
+        key = tuple(str(labels[n]) for n in self.label_names)
+        child = self._children.get(key)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(key, self._new_child())
+
+        return child
+
+    def _new_child(self):
+        """
+        :return: A new unlabeled metric of the same type
+        """
+        return type(self)()
+
+    def samples(self):
+        """
+        :return: List of (suffix, labels, value) tuples
+        """
+        if not self.label_names:
+            return self._samples({})
+
+        samples = []
+        for key, child in self._children.items():
+            samples.extend(child._samples(dict(zip(self.label_names, key))))
+
+        return samples
+
+    def _samples(self, labels):
+        return [('', labels, self.value)]
+
+
+class Counter(Metric):
+    """
+    Monotonically increasing value.
+    """
+    type = 'counter'
+
+    def __init__(self, name='', help='', label_names=()):
+        super(Counter, self).__init__(name, help, label_names)
+        self.value = 0.0
+
+    def inc(self, amount=1.0):
+        self.value += amount
+
+
+class Gauge(Metric):
+    """
+    Value that can go up and down. Instead of being set, the value
+    can be read from a function when the metric is exported.
+    """
+    type = 'gauge'
+
+    def __init__(self, name='', help='', label_names=()):
+        super(Gauge, self).__init__(name, help, label_names)
+        self.value = 0.0
+        self._function = None
+
+    def set(self, value):
+        self.value = value
+
+    def inc(self, amount=1.0):
+        self.value += amount
+
+    def set_function(self, fn):
+        """
+        :param fn: Callable without arguments returning the current value
+        :return:
+        """
+        self._function = fn
+
+    def _samples(self, labels):
+        value = self._function() if self._function else self.value
+        return [('', labels, value)]
+
+
+class Histogram(Metric):
+    """
+    Distribution of observed values over a fixed set of buckets.
+    """
+    type = 'histogram'
+
+    def __init__(self, name='', help='', label_names=(), buckets=DEFAULT_BUCKETS):
+        super(Histogram, self).__init__(name, help, label_names)
+        self.buckets = tuple(sorted(buckets))
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def _new_child(self):
+        return Histogram(buckets=self.buckets)
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def _samples(self, labels):
+        samples = []
+        cumulative = 0
+        for bound, count in zip(self.buckets + (float('inf'),), self.counts):
+            cumulative += count
+            le = '+Inf' if bound == float('inf') else repr(bound)
+            samples.append(('_bucket', dict(labels, le=le), cumulative))
+
+        samples.append(('_count', labels, self.count))
+        samples.append(('_sum', labels, self.sum))
+        return samples
+
+
+class Registry(object):
+    """
+    Collection of named metrics. Registering a metric under an existing
+    name returns the existing metric, so instrumented classes can be
+    instantiated more than once.
+    """
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _register(self, cls, name, help, label_names, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, help, label_names, **kwargs)
+            elif not isinstance(metric, cls):
+                raise ValueError("Metric `%s` already registered as a %s." % (name, metric.type))
+
+        return metric
+
+    def counter(self, name, help, label_names=()):
+        """
+        :rtype: Counter
+        """
+        return self._register(Counter, name, help, label_names)
+
+    def gauge(self, name, help, label_names=()):
+        """
+        :rtype: Gauge
+        """
+        return self._register(Gauge, name, help, label_names)
+
+    def histogram(self, name, help, label_names=(), buckets=DEFAULT_BUCKETS):
+        """
+        :rtype: Histogram
+        """
+        return self._register(Histogram, name, help, label_names, buckets=buckets)
+
+    def metrics(self):
+        """
+        :return: All registered metrics, sorted by name
+        """
+        with self._lock:
+            return [self._metrics[k] for k in sorted(self._metrics)]
+
+
+# Default registry
+metrics = Registry()
@@ -0,0 +1,5 @@
+from .writer import OutputWriter, AsyncCsvWriter, CsvFiles
+from .columnar import ColumnarWriter, ColumnarReader, is_columnar
+from .poses import PoseLog, PoseReader
+from .pack import RobotPackWriter, RobotPackReader, RobotLoader, is_pack
+__author__ = 'Elte Hupkes'
@@ -0,0 +1,245 @@
+"""
+Chunked columnar output format. A table is a directory containing
+`.npy` chunk files of a structured NumPy dtype and a `manifest.json`
+describing the columns and the chunks, in order. Chunks can be memory
+mapped, so reading a table does not require parsing text.
+
+Rows that have not filled a chunk yet at the time of a snapshot are saved
+to a pending file named after the number of chunks before them, so they
+can be restored without writing a short chunk.
+"""
+from __future__ import absolute_import
+import csv
+import glob
+import json
+import os
+import re
+import shutil
+import numpy as np
+
+MANIFEST = 'manifest.json'
+PENDING = 'pending_%06d.npy'
+
+
+def _write_json(filename, data):
+    tmp = filename + '.tmp'
+    with open(tmp, 'w') as f:
+        json.dump(data, f)
+
+    os.rename(tmp, filename)
+
+
+class ColumnarWriter(object):
+    """
+    Writer with the interface of a `csv.writer`, which buffers rows
+    and appends them to a columnar table in chunks of `chunk_size`.
+    Chunks are written by an `OutputWriter`.
+    """
+
+    def __init__(self, output, directory, header, dtypes, chunk_size=10000, restore=False,
+                 mark=None):
+        """
+        :param output:
+        :type output: OutputWriter
+        :param directory: Table directory
+        :param header: Column names, same as the CSV header
+        :param dtypes: NumPy dtype of each column
+        :param chunk_size: Number of rows per chunk
+        :param restore: If true, the table is restored and appended to.
+        :param mark: State to restore the table to, as returned by `mark`,
+                     or a number of chunks. If not given, the table is restored
+                     from a manifest snapshot, as written by older versions.
+        :return:
+        """
+        self.output = output
+        self.directory = directory
+        self.dtype = np.dtype(zip(header, dtypes))
+        self.chunk_size = chunk_size
+        self._rows = []
+        self._marked_chunks = 0
+
+        manifest = os.path.join(directory, MANIFEST)
+        if restore:
+            if mark is None:
+                shutil.copy(manifest + '.snapshot', manifest)
+
+            with open(manifest) as f:
+                self.manifest = json.load(f)
+
+            if mark is not None:
+                chunks, pending = (mark, 0) if isinstance(mark, (int, long)) else mark
+                del self.manifest['chunks'][chunks:]
+                _write_json(manifest, self.manifest)
+
+                if pending:
+                    data = np.load(os.path.join(directory, PENDING % chunks))
+                    self._rows = [tuple(r) for r in data[:pending].tolist()]
+
+                self._marked_chunks = chunks
+        else:
+            if not os.path.isdir(directory):
+                os.makedirs(directory)
+
+            self.manifest = {
+                'columns': [[n, np.dtype(t).str] for n, t in zip(header, dtypes)],
+                'chunks': []
+            }
+            _write_json(manifest, self.manifest)
+
+    @property
+    def filename(self):
+        return self.directory
+
+    def writerow(self, row):
+        """
+        :param row:
+        :return:
+        """
+        self._rows.append(tuple(row))
+        if len(self._rows) >= self.chunk_size:
+            self.write_chunk()
+
+    def writerows(self, rows):
+        """
+        :param rows:
+        :return:
+        """
+        for row in rows:
+            self.writerow(row)
+
+    def write_chunk(self):
+        """
+        Writes all buffered rows as a new chunk.
+        :return:
+        """
+        if not self._rows:
+            return
+
+        data = np.array(self._rows, dtype=self.dtype)
+        self._rows = []
+
+        name = 'chunk_%06d.npy' % len(self.manifest['chunks'])
+        self.manifest['chunks'].append({'file': name, 'rows': len(data)})
+        manifest = json.loads(json.dumps(self.manifest))
+        self.output.write(None, self._save, (name, data, manifest))
+
+    def _save(self, name, data, manifest):
+        """
+        Saves a chunk and the manifest that includes it, called
+        on the writer thread.
+        """
+        tmp = os.path.join(self.directory, name + '.tmp')
+        with open(tmp, 'wb') as f:
+            np.save(f, data)
+
+        os.rename(tmp, os.path.join(self.directory, name))
+        _write_json(os.path.join(self.directory, MANIFEST), manifest)
+
+    def chunk_count(self):
+        """
+        :return: Number of chunks written or queued
+        """
+        return len(self.manifest['chunks'])
+
+    def mark(self):
+        """
+        Saves the rows that do not fill a chunk yet to the pending file
+        of the current chunk count. Pending files from before the
+        previous mark are no longer needed and are removed.
+        :return: Tuple of the chunk count and the number of pending rows
+        """
+        chunks = self.chunk_count()
+        if self._rows:
+            data = np.array(self._rows, dtype=self.dtype)
+            self.output.write(None, self._save_pending, (PENDING % chunks, data))
+
+        self.output.write(None, self._remove_pending, (self._marked_chunks,))
+        self._marked_chunks = chunks
+        return chunks, len(self._rows)
+
+    def _save_pending(self, name, data):
+        """
+        Saves pending rows, called on the writer thread.
+        """
+        tmp = os.path.join(self.directory, name + '.tmp')
+        with open(tmp, 'wb') as f:
+            np.save(f, data)
+
+        os.rename(tmp, os.path.join(self.directory, name))
+
+    def _remove_pending(self, before):
+        """
+        Removes the pending files of chunk counts below `before`,
+        called on the writer thread.
+        """
+        for filename in glob.glob(os.path.join(self.directory, 'pending_*.npy')):
+            match = re.match(r'pending_(\d+)\.npy$', os.path.basename(filename))
+            if match and int(match.group(1)) < before:
+                os.remove(filename)
+
+    def close(self):
+        self.write_chunk()
+
+
+class ColumnarReader(object):
+    """
+    Reads a columnar table, memory mapping its chunks.
+    """
+
+    def __init__(self, directory):
+        """
+        :param directory: Table directory
+        :return:
+        """
+        self.directory = directory
+        with open(os.path.join(directory, MANIFEST)) as f:
+            self.manifest = json.load(f)
+
+        self.columns = [c[0] for c in self.manifest['columns']]
+        self.dtype = np.dtype([(str(n), str(t)) for n, t in self.manifest['columns']])
+
+    def __len__(self):
+        return sum(c['rows'] for c in self.manifest['chunks'])
+
+    def chunks(self):
+        """
+        :return: Iterator over the memory mapped chunk arrays
+        """
+        for chunk in self.manifest['chunks']:
+            yield np.load(os.path.join(self.directory, chunk['file']), mmap_mode='r')
+
+    def read(self):
+        """
+        :return: Structured array with all rows in the table
+        """
+        chunks = list(self.chunks())
+        return np.concatenate(chunks) if chunks else np.zeros(0, dtype=self.dtype)
+
+    def column(self, name):
+        """
+        :param name:
+        :return: Array with all values of the given column
+        """
+        chunks = [c[name] for c in self.chunks()]
+        return np.concatenate(chunks) if chunks else np.zeros(0, dtype=self.dtype[name])
+
+    def to_csv(self, filename):
+        """
+        Exports the table to a CSV file in the format of the
+        regular CSV output.
+        :param filename:
+        :return:
+        """
+        with open(filename, 'wb') as f:
+            writer = csv.writer(f, delimiter=',')
+            writer.writerow(self.columns)
+            for chunk in self.chunks():
+                writer.writerows(chunk.tolist())
+
+
+def is_columnar(directory):
+    """
+    :param directory:
+    :return: True if the given path is a columnar table
+    """
+    return os.path.isfile(os.path.join(directory, MANIFEST))
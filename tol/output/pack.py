@@ -0,0 +1,189 @@
+"""
+Append-only pack file for robot protobuf messages. A pack consists of a
+data file with the serialized messages back to back and an index file
+of fixed-width `(id, offset, length)` records. Both are only appended to;
+if a robot ID occurs more than once the last entry wins.
+"""
+from __future__ import absolute_import
+import glob
+import mmap
+import os
+import re
+import numpy as np
+from revolve.spec import Robot as ProtoRobot
+
+from .writer import open_truncated
+
+DATA_FILE = 'robots.pack'
+INDEX_FILE = 'robots.pack.idx'
+
+INDEX_DTYPE = np.dtype([('id', '<i8'), ('offset', '<i8'), ('length', '<i8')])
+
+
+def _read_index(directory):
+    """
+    :param directory:
+    :return: Index records that point to complete data in the data file
+    """
+    index_file = os.path.join(directory, INDEX_FILE)
+    count = os.path.getsize(index_file) // INDEX_DTYPE.itemsize
+    index = np.fromfile(index_file, dtype=INDEX_DTYPE, count=count)
+
+    # The index may have been flushed before the data it points to
+    size = os.path.getsize(os.path.join(directory, DATA_FILE))
+    return index[index['offset'] + index['length'] <= size]
+
+
+def is_pack(directory):
+    """
+    :param directory:
+    :return: True if the directory contains a robot pack
+    """
+    return os.path.isfile(os.path.join(directory, INDEX_FILE))
+
+
+class RobotPackWriter(object):
+    """
+    Appends serialized robots to a pack through an `OutputWriter`.
+    """
+
+    def __init__(self, output, directory, restore=False, entries=None):
+        """
+        :param output:
+        :type output: OutputWriter
+        :param directory:
+        :param restore: If true, an existing pack is appended to,
+                        otherwise it is overwritten.
+        :param entries: Number of entries to truncate a restored
+                        pack to, as returned by `mark`.
+        :return:
+        """
+        self.output = output
+        data_file = os.path.join(directory, DATA_FILE)
+        index_file = os.path.join(directory, INDEX_FILE)
+
+        if restore and is_pack(directory):
+            # Drop incomplete entries and unindexed data
+            index = _read_index(directory)[:entries]
+            self.entries = len(index)
+            self.offset = int((index['offset'] + index['length']).max()) if len(index) else 0
+            self.data = open_truncated(data_file, self.offset)
+            self.index = open_truncated(index_file, self.entries * INDEX_DTYPE.itemsize)
+        else:
+            self.entries = 0
+            self.offset = 0
+            self.data = open(data_file, 'wb')
+            self.index = open(index_file, 'wb')
+
+    def write(self, robot_id, data):
+        """
+        :param robot_id:
+        :param data: Serialized robot
+        :type data: str
+        :return:
+        """
+        entry = np.array([(robot_id, self.offset, len(data))], dtype=INDEX_DTYPE).tostring()
+        self.offset += len(data)
+        self.entries += 1
+        self.output.write(self.data, self.data.write, (data,))
+        self.output.write(self.index, self.index.write, (entry,))
+
+    def mark(self):
+        """
+        :return: Number of entries in the pack
+        """
+        return self.entries
+
+    def close(self):
+        self.output.close_file(self.data)
+        self.output.close_file(self.index)
+
+
+class RobotPackReader(object):
+    """
+    Random access to the robots in a pack, the data file is memory mapped.
+    """
+
+    def __init__(self, directory):
+        """
+        :param directory:
+        :return:
+        """
+        index = _read_index(directory)
+        self._entries = {int(i): (int(o), int(l)) for i, o, l in index.tolist()}
+
+        self._file = open(os.path.join(directory, DATA_FILE), 'rb')
+        self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) \
+            if os.path.getsize(self._file.name) else None
+
+    def __contains__(self, robot_id):
+        return int(robot_id) in self._entries
+
+    def __len__(self):
+        return len(self._entries)
+
+    def ids(self):
+        """
+        :return: Sorted list of robot IDs in the pack
+        """
+        return sorted(self._entries)
+
+    def get_bytes(self, robot_id):
+        """
+        :param robot_id:
+        :return: Serialized robot
+        """
+        offset, length = self._entries[int(robot_id)]
+        return self._mmap[offset:offset + length]
+
+    def close(self):
+        if self._mmap is not None:
+            self._mmap.close()
+
+        self._file.close()
+
+
+class RobotLoader(object):
+    """
+    Loads the robot protobuf messages of an output directory, either
+    from a robot pack or from the individual `robot_<id>.pb` files.
+    """
+
+    def __init__(self, directory):
+        """
+        :param directory:
+        :return:
+        """
+        self.directory = directory
+        self.pack = RobotPackReader(directory) if is_pack(directory) else None
+
+    def ids(self):
+        """
+        :return: Sorted list of the robot IDs in the directory
+        """
+        if self.pack is not None:
+            return self.pack.ids()
+
+        files = glob.glob(os.path.join(self.directory, 'robot_*.pb'))
+        return sorted(int(re.match(r'robot_(\d+)\.pb$', os.path.basename(f)).group(1))
+                      for f in files)
+
+    def get_bytes(self, robot_id):
+        """
+        :param robot_id:
+        :return: Serialized robot
+        """
+        if self.pack is not None:
+            return self.pack.get_bytes(robot_id)
+
+        with open(os.path.join(self.directory, 'robot_%s.pb' % robot_id), 'rb') as f:
+            return f.read()
+
+    def get(self, robot_id):
+        """
+        :param robot_id:
+        :return: Robot protobuf message
+        """
+        robot = ProtoRobot()
+        robot.ParseFromString(self.get_bytes(robot_id))
+        return robot
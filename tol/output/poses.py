@@ -0,0 +1,249 @@
+"""
+Binary pose log. The file starts with a small header, followed by
+fixed-width little endian records of robot id, simulation time and
+position, and optionally orientation. Records are only ever appended,
+so a log that was cut off by a crash can still be read up to its last
+complete record.
+
+Within a run records are in time order. When the world is reset between
+runs the simulation time starts over, so a log can hold several runs;
+the reader finds their boundaries where the time goes back.
+"""
+from __future__ import absolute_import
+import os
+import struct
+import time
+import numpy as np
+
+from .writer import open_truncated
+
+MAGIC = b'TOLPOSE1'
+HEADER = struct.Struct('<8sI')
+HEADER_SIZE = HEADER.size
+
+# Header flags
+FLAG_ORIENTATION = 1
+
+POSE_FIELDS = [('id', '<i4'), ('sec', '<i4'), ('nsec', '<i4'),
+               ('x', '<f8'), ('y', '<f8'), ('z', '<f8')]
+
+ORIENTATION_FIELDS = [('qw', '<f8'), ('qx', '<f8'), ('qy', '<f8'), ('qz', '<f8')]
+
+
+def pose_dtype(orientation=False):
+    """
+    :param orientation: Whether records include the orientation quaternion
+    :return: Record dtype of a pose log
+    """
+    return np.dtype(POSE_FIELDS + (ORIENTATION_FIELDS if orientation else []))
+
+
+class PoseLog(object):
+    """
+    Appends pose records to a binary pose log through an `OutputWriter`.
+    Records are buffered and handed to the writer in batches, either when
+    `batch_size` records are buffered or when `flush_interval` seconds
+    have passed since the last batch.
+    """
+
+    def __init__(self, output, filename, orientation=False, batch_size=10000,
+                 flush_interval=1.0, restore=False, offset=None):
+        """
+        :param output:
+        :type output: OutputWriter
+        :param filename:
+        :param orientation: Also log the orientation of every robot
+        :param batch_size: Maximum number of buffered records
+        :param flush_interval: Maximum number of seconds records are buffered
+        :param restore: If true, the log is appended to, otherwise
+                        it is overwritten.
+        :param offset: Byte offset to truncate a restored log to,
+                       as returned by `mark`.
+        :return:
+        """
+        self.output = output
+        self.filename = filename
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+
+        if restore and os.path.exists(filename):
+            orientation = PoseReader.read_header(filename)
+
+            # Drop a partially written last record
+            size = os.path.getsize(filename) if offset is None else offset
+            itemsize = pose_dtype(orientation).itemsize
+            self.offset = HEADER_SIZE + ((size - HEADER_SIZE) // itemsize) * itemsize
+            self.file = open_truncated(filename, self.offset)
+        else:
+            self.file = open(filename, 'wb')
+            flags = FLAG_ORIENTATION if orientation else 0
+            output.write(self.file, self.file.write, (HEADER.pack(MAGIC, flags),))
+            self.offset = HEADER_SIZE
+
+        self.orientation = orientation
+        self.dtype = pose_dtype(orientation)
+        self._buffer = []
+        self._buffered = 0
+        self._last_flush = time.time()
+
+    def append(self, records):
+        """
+        :param records: Sequence of record tuples, in the field order of `dtype`
+        :return:
+        """
+        if not records:
+            return
+
+        self._buffer.append(np.array(records, dtype=self.dtype))
+        self._buffered += len(records)
+
+        if self._buffered >= self.batch_size or \
+                time.time() - self._last_flush >= self.flush_interval:
+            self.flush()
+
+    def flush(self):
+        """
+        Hands all buffered records to the output writer.
+        :return:
+        """
+        self._last_flush = time.time()
+        if not self._buffer:
+            return
+
+        data = np.concatenate(self._buffer).tostring()
+        self._buffer = []
+        self._buffered = 0
+        self.offset += len(data)
+        self.output.write(self.file, self.file.write, (data,))
+
+    def mark(self):
+        """
+        Flushes the buffered records.
+        :return: Byte offset of the end of the log
+        """
+        self.flush()
+        return self.offset
+
+    def close(self):
+        self.flush()
+        self.output.close_file(self.file)
+
+
+class PoseReader(object):
+    """
+    Memory maps a binary pose log.
+    """
+
+    def __init__(self, filename):
+        """
+        :param filename:
+        :return:
+        """
+        self.filename = filename
+        self.orientation = self.read_header(filename)
+        self.dtype = pose_dtype(self.orientation)
+
+        # Ignore a partially written last record
+        count = (os.path.getsize(filename) - HEADER_SIZE) // self.dtype.itemsize
+        if count > 0:
+            self.records = np.memmap(filename, dtype=self.dtype, mode='r',
+                                     offset=HEADER_SIZE, shape=(count,))
+        else:
+            self.records = np.zeros(0, dtype=self.dtype)
+
+        self._runs = None
+
+    @staticmethod
+    def read_header(filename):
+        """
+        :param filename:
+        :return: Whether the log contains orientations
+        """
+        with open(filename, 'rb') as f:
+            data = f.read(HEADER_SIZE)
+
+        if len(data) < HEADER_SIZE:
+            raise ValueError("`%s` is not a pose log." % filename)
+
+        magic, flags = HEADER.unpack(data)
+        if magic != MAGIC:
+            raise ValueError("`%s` is not a pose log." % filename)
+
+        return bool(flags & FLAG_ORIENTATION)
+
+    def __len__(self):
+        return len(self.records)
+
+    def times(self, records=None):
+        """
+        :param records: Records to get the times of, defaults to all records
+        :return: Array of simulation times in seconds
+        """
+        records = self.records if records is None else records
+        return records['sec'] + 1e-9 * records['nsec']
+
+    def robot_ids(self):
+        """
+        :return: Sorted array of the robot IDs in the log
+        """
+        return np.unique(self.records['id'])
+
+    def robot(self, robot_id):
+        """
+        :param robot_id:
+        :return: All records of the given robot, in time order
+        """
+        return self.records[self.records['id'] == robot_id]
+
+    def runs(self):
+        """
+        :return: List of `(start, end)` record index ranges of the runs
+                 in the log, split where the simulation time goes back.
+        """
+        if self._runs is None:
+            times = self.times()
+            bounds = [0] + list(np.flatnonzero(np.diff(times) < 0) + 1) + [len(times)]
+            self._runs = [(int(lo), int(hi)) for lo, hi in zip(bounds[:-1], bounds[1:]) if hi > lo]
+
+        return self._runs
+
+    def time_range(self, start=None, end=None, run=None):
+        """
+        Records with a time in `[start, end)` within a single run. Records
+        of a run are in time order, so this only reads the records it
+        bisects and returns a view.
+
+        :param start: Start time in seconds, or `None`
+        :param end: End time in seconds, or `None`
+        :param run: Index of the run in `runs()`, required if the
+                    log contains more than one run.
+        :return:
+        """
+        runs = self.runs()
+        if run is None:
+            if len(runs) > 1:
+                raise ValueError("Pose log contains %d runs, a run has to be given." % len(runs))
+
+            run = 0
+
+        lo, hi = runs[run] if runs else (0, 0)
+        first = lo if start is None else self._bisect(start, lo, hi)
+        last = hi if end is None else self._bisect(end, lo, hi)
+        return self.records[first:last]
+
+    def _bisect(self, t, lo, hi):
+        """
+        :param t:
+        :param lo: First record of the run
+        :param hi: End of the run
+        :return: Index of the first record of the run with a time of at least `t`
+        """
+        records = self.records
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if records[mid]['sec'] + 1e-9 * records[mid]['nsec'] < t:
+                lo = mid + 1
+            else:
+                hi = mid
+
+        return lo
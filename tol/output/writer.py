@@ -0,0 +1,334 @@
+from __future__ import absolute_import
+import csv
+import os
+import shutil
+import threading
+import time
+import Queue
+
+from ..logging import logger
+from .columnar import ColumnarWriter
+
+# Maximum number of queued items written in one batch
+BATCH_SIZE = 1000
+
+
+def open_truncated(filename, offset):
+    """
+    Opens an existing file for appending after truncating it to
+    the given byte offset, as returned by `OutputWriter.flush_and_mark`.
+    :param filename:
+    :param offset:
+    :return:
+    """
+    f = open(filename, 'r+b')
+    f.truncate(offset)
+    f.seek(0, os.SEEK_END)
+    return f
+
+
+class OutputWriter(object):
+    """
+    Writes output files from a background thread, so slow disks do not
+    stall the event loop. Rows are put on a bounded queue (blocking only
+    when it is full) and written in batches. Files are flushed every
+    `flush_interval` seconds; with the `fsync` durability policy they
+    are also synced to disk.
+    """
+
+    def __init__(self, flush_interval=1.0, durability='flush', queue_size=10000):
+        """
+        :param flush_interval: Seconds between file flushes
+        :type flush_interval: float
+        :param durability: Either `flush` or `fsync`
+        :type durability: str
+        :param queue_size: Maximum number of queued write operations
+        :type queue_size: int
+        :return:
+        """
+        if durability not in ('flush', 'fsync'):
+            raise ValueError("Unknown durability policy `%s`." % durability)
+
+        self.flush_interval = flush_interval
+        self.durability = durability
+        self._queue = Queue.Queue(maxsize=queue_size)
+        self._files = set()
+        self._error = None
+
+        self._thread = threading.Thread(target=self._run, name="tol-output-writer")
+        self._thread.daemon = True
+        self._thread.start()
+
+    def backlog(self):
+        """
+        :return: Number of write operations waiting in the queue
+        """
+        return self._queue.qsize()
+
+    def open_csv(self, filename, mode='wb', truncate=None):
+        """
+        :param filename:
+        :param mode:
+        :param truncate: If given, the existing file is truncated to this
+                         byte offset and appended to, `mode` is ignored.
+        :return: CSV writer that writes through this output writer
+        :rtype: AsyncCsvWriter
+        """
+        f = open_truncated(filename, truncate) if truncate is not None else open(filename, mode)
+        self.register(f)
+        return AsyncCsvWriter(self, f)
+
+    def register(self, f):
+        """
+        Adds a file to the files that are flushed and marked by the
+        writer, also before anything is written to it.
+        :param f:
+        :return:
+        """
+        self._put(('open', f))
+
+    def _put(self, item):
+        if self._error is not None:
+            raise self._error
+
+        self._queue.put(item)
+
+    def write(self, f, fn, args):
+        """
+        Schedules `fn(*args)` to be called on the writer thread,
+        `f` is the file written to, if any. Such files are flushed
+        by the writer.
+        :return:
+        """
+        self._put(('write', f, fn, args))
+
+    def flush_and_mark(self):
+        """
+        Blocks until all queued writes are done and all files are flushed
+        (and synced, depending on the durability policy).
+
+        :return: Dictionary with the byte offset of each open file by filename
+        :rtype: dict[str, int]
+        """
+        done = threading.Event()
+        marks = {}
+        self._put(('mark', done, marks))
+        done.wait()
+
+        if self._error is not None:
+            raise self._error
+
+        return marks
+
+    def close_file(self, f):
+        """
+        Closes the given file after all pending writes to it.
+        :param f:
+        :return:
+        """
+        self._put(('close', f))
+
+    def close(self):
+        """
+        Writes all pending data and stops the writer thread.
+        :return:
+        """
+        self._put(('stop',))
+        self._thread.join()
+
+    def _flush(self):
+        for f in self._files:
+            f.flush()
+            if self.durability == 'fsync':
+                os.fsync(f.fileno())
+
+    def _run(self):
+        """
+        Writer thread main loop.
+        """
+        last_flush = time.time()
+        running = True
+
+        while running:
+            timeout = max(0.0, self.flush_interval - (time.time() - last_flush))
+            try:
+                batch = [self._queue.get(timeout=timeout)]
+            except Queue.Empty:
+                batch = []
+
+            while batch and len(batch) < BATCH_SIZE:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except Queue.Empty:
+                    break
+
+            try:
+                for item in batch:
+                    kind = item[0]
+                    if kind == 'write':
+                        _, f, fn, args = item
+                        if f is not None:
+                            self._files.add(f)
+                        fn(*args)
+                    elif kind == 'open':
+                        self._files.add(item[1])
+                    elif kind == 'mark':
+                        _, done, marks = item
+                        self._flush()
+                        last_flush = time.time()
+                        marks.update((f.name, f.tell()) for f in self._files)
+                        done.set()
+                    elif kind == 'close':
+                        f = item[1]
+                        self._files.discard(f)
+                        f.close()
+                    elif kind == 'stop':
+                        running = False
+
+                if time.time() - last_flush >= self.flush_interval or not running:
+                    self._flush()
+                    last_flush = time.time()
+            except Exception as e:
+                logger.exception("Error in output writer thread.")
+                self._error = e
+
+                # Release anyone waiting for a mark
+                for item in batch:
+                    if item[0] == 'mark':
+                        item[1].set()
+
+
+class AsyncCsvWriter(object):
+    """
+    Drop-in replacement for a `csv.writer`, of which the rows
+    are written by an `OutputWriter`.
+    """
+
+    def __init__(self, output, f):
+        """
+        :param output:
+        :type output: OutputWriter
+        :param f: File object
+        :return:
+        """
+        self.output = output
+        self.file = f
+        self._csv = csv.writer(f, delimiter=',')
+
+    @property
+    def filename(self):
+        return self.file.name
+
+    def writerow(self, row):
+        """
+        :param row:
+        :return:
+        """
+        self.output.write(self.file, self._csv.writerow, (list(row),))
+
+    def writerows(self, rows):
+        """
+        :param rows:
+        :return:
+        """
+        self.output.write(self.file, self._csv.writerows, ([list(r) for r in rows],))
+
+    def close(self):
+        self.output.close_file(self.file)
+
+
+class CsvFiles(object):
+    """
+    The set of CSV output files of an experiment manager, each
+    accessible by name as an `AsyncCsvWriter`. If there is no output
+    directory, every writer is `None`.
+
+    Outputs for which column types are given can be written in the
+    columnar format instead, see `tol.output.columnar`.
+
+    A snapshot of the files only records their current size (the byte
+    offset of CSV files, the chunk count and pending rows of columnar
+    tables), restoring truncates them back to that size.
+    """
+
+    def __init__(self, output, directory, headers, restore=False, marks=None,
+                 dtypes=None, columnar=False, chunk_size=10000):
+        """
+        :param output:
+        :type output: OutputWriter
+        :param directory: Output directory, or `None`
+        :param headers: Dictionary of CSV name => header row
+        :type headers: dict
+        :param restore: If true, the files are restored and appended to,
+                        otherwise they are overwritten.
+        :param marks: The result of `snapshot()` to restore the files to. If
+                      not given, the files are restored from `.snapshot`
+                      copies, as written by older versions.
+        :type marks: dict
+        :param dtypes: Dictionary of CSV name => NumPy column types
+        :type dtypes: dict
+        :param columnar: Write the outputs that have column types in the
+                         columnar format, to a directory with the CSV name.
+        :param chunk_size: Rows per columnar chunk
+        :return:
+        """
+        self.output = output
+        self.writers = {k: None for k in headers}
+        dtypes = dtypes or {}
+
+        if not directory:
+            return
+
+        for k in headers:
+            mark = marks.get(k) if marks is not None else None
+            if columnar and k in dtypes:
+                self.writers[k] = ColumnarWriter(output, os.path.join(directory, k), headers[k],
+                                                 dtypes[k], chunk_size=chunk_size, restore=restore,
+                                                 mark=mark)
+                continue
+
+            fname = os.path.join(directory, k + '.csv')
+            if restore and mark is not None:
+                writer = output.open_csv(fname, truncate=mark)
+            elif restore and marks is None and os.path.exists(fname + '.snapshot'):
+                shutil.copy(fname + '.snapshot', fname)
+                writer = output.open_csv(fname, 'ab')
+            elif restore and os.path.exists(fname):
+                # Not part of the snapshot, keep the file as it is
+                writer = output.open_csv(fname, 'ab')
+            else:
+                writer = output.open_csv(fname, 'wb')
+                writer.writerow(headers[k])
+
+            self.writers[k] = writer
+
+    def __getitem__(self, k):
+        return self.writers[k]
+
+    def snapshot(self):
+        """
+        Flushes all files and returns their current size.
+        :return: Dictionary of CSV name => mark, to be stored
+                 with the snapshot data.
+        :rtype: dict
+        """
+        marks = {}
+        for k, writer in self.writers.iteritems():
+            if isinstance(writer, ColumnarWriter):
+                marks[k] = writer.mark()
+
+        offsets = self.output.flush_and_mark()
+        for k, writer in self.writers.iteritems():
+            if writer and k not in marks:
+                # Every open file is registered with the output writer
+                marks[k] = offsets[writer.filename]
+
+        return marks
+
+    def close(self):
+        """
+        :return:
+        """
+        for writer in self.writers.values():
+            if writer:
+                writer.close()
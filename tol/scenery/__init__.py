@@ -1,3 +1,4 @@
 from .wall import Wall
 from .birth_clinic import BirthClinic
+from .arena import Arena
 __author__ = 'Elte Hupkes'
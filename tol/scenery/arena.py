@@ -0,0 +1,39 @@
+from sdfbuilder import Model
+
+from .wall import make_wall_link
+from .birth_clinic import BirthClinic
+
+
+class Arena(Model):
+    """
+    Static model containing all arena walls as separate links, and
+    optionally the birth clinic, so the complete arena can be inserted
+    with a single request.
+    """
+
+    def __init__(self, points, thickness, height, birth_clinic_diameter=None,
+                 name="arena", **kwargs):
+        """
+        :param points: Corner points of the arena wall, a wall segment
+                       is built between every pair of consecutive points.
+        :type points: list[Vector3]
+        :param thickness: Wall thickness
+        :param height: Wall height
+        :param birth_clinic_diameter: If given, a birth clinic with this
+                                      diameter is added to the arena.
+        :param name:
+        :return:
+        """
+        super(Arena, self).__init__(name, static=True, **kwargs)
+
+        self.walls = []
+        l = len(points)
+        for i in range(l):
+            wall = make_wall_link("wall_%d" % i, points[i], points[(i + 1) % l], thickness, height)
+            self.walls.append(wall)
+            self.add_element(wall)
+
+        self.birth_clinic = None
+        if birth_clinic_diameter:
+            self.birth_clinic = BirthClinic(diameter=birth_clinic_diameter).link
+            self.add_element(self.birth_clinic)
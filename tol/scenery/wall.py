@@ -2,6 +2,40 @@ from sdfbuilder import Model, Posable, Link
 from sdfbuilder.math import Vector3
 
 
+def make_wall_link(name, start, end, thickness, height):
+    """
+    Creates a link containing a box of the given thickness and
+    height from `start` to `end`, positioned in the frame of
+    its parent.
+
+    :param name:
+    :param start: Starting point of the wall.
+    :type start: Vector3
+    :param end: Ending point of the wall.
+    :type end: Vector3
+    :param thickness:
+    :param height:
+    :return:
+    :rtype: Link
+    """
+    assert start.z == end.z, "Walls with different start / end z are undefined."
+
+    center = 0.5 * (end + start)
+    diff = end - start
+    size = abs(diff)
+    link = Link(name)
+    link.make_box(10e10, size, thickness, height)
+
+    # Rotate the wall so it aligns with the vector from
+    # x to y
+    link.align(
+        Vector3(0, 0, 0), Vector3(1, 0, 0), Vector3(0, 0, 1),
+        center, diff, Vector3(0, 0, 1), Posable("mock")
+    )
+
+    return link
+
+
 class Wall(Model):
     """
     Simple wall model to wall off the
@@ -19,19 +53,5 @@ class Wall(Model):
         :return:
         """
         super(Wall, self).__init__(name, static=True, **kwargs)
-        assert start.z == end.z, "Walls with different start / end z are undefined."
-
-        center = 0.5 * (end + start)
-        diff = end - start
-        size = abs(diff)
-        self.wall = Link("wall_link")
-        self.wall.make_box(10e10, size, thickness, height)
-
-        # Rotate the wall so it aligns with the vector from
-        # x to y
-        self.align(
-            Vector3(0, 0, 0), Vector3(1, 0, 0), Vector3(0, 0, 1),
-            center, diff, Vector3(0, 0, 1), Posable("mock")
-        )
-
+        self.wall = make_wall_link("wall_link", start, end, thickness, height)
         self.add_element(self.wall)
@@ -3,7 +3,7 @@ Includes functions for robot tree analysis, to:
 
 - Determine the number of extremities per robot
 - Determine the number of joints per robot
--
+- Compute all morphology statistics of a robot at once (`Morphology`)
 """
 import itertools
 from revolve.angle.representation import Tree, Node
@@ -68,3 +68,36 @@ def count_connections(node):
     """
     return len(node.get_neural_connections()) + sum(count_connections(c.node)
                                                     for c in node.child_connections())
+
+
+class Morphology(object):
+    """
+    Morphology statistics of a robot tree, computed once so they
+    can be reused by everything that logs or analyzes the robot.
+    """
+
+    def __init__(self, tree):
+        """
+        :param tree:
+        :type tree: Tree
+        :return:
+        """
+        root = tree.root
+        self.size = len(tree)
+        self.extremity_count = count_extremities(root)
+        self.joint_count = count_joints(root)
+        self.motor_count = count_motors(root)
+        self.inputs, self.outputs, self.hidden = root.io_count(recursive=True)
+        self.connections = count_connections(root)
+
+        # Tuples of (size, joint count, motor count) for each extremity
+        self.extremities = [(len(extr), count_joints(extr), count_motors(extr))
+                            for extr in list_extremities(root)]
+
+    def extremity_rows(self, robot_id):
+        """
+        :param robot_id:
+        :return: Rows of (robot_id, extremity_id, extremity_size,
+                 joint_count, motor_count) for each extremity
+        """
+        return [(robot_id, i) + extr for i, extr in enumerate(self.extremities)]
@@ -0,0 +1,231 @@
+"""
+In-process replacement for the external body analyzer. The collision
+geometry of a robot is taken from the SDF model generated by the robot
+builder, every collision is turned into an oriented box and the boxes
+are tested for intersections with separating axis tests.
+
+Like in the Gazebo analyzer, collisions within the same link or in two
+links connected by a joint are not considered intersecting.
+"""
+from __future__ import absolute_import
+import itertools
+import numpy as np
+
+from sdfbuilder import Link
+from sdfbuilder.joint import Joint
+from sdfbuilder.structure import Collision
+from sdfbuilder.math import Vector3
+
+from ..build import get_simulation_robot
+
+# Boxes are shrunk by this amount (in meters) on every side before
+# testing, so parts that merely touch are not counted as intersecting.
+CONTACT_TOLERANCE = 1e-3
+
+
+class BoundingBox(object):
+    """
+    Axis aligned bounding box of a robot, in the model frame.
+    """
+
+    def __init__(self, min, max):
+        """
+        :param min:
+        :type min: Vector3
+        :param max:
+        :type max: Vector3
+        """
+        self.min = min
+        self.max = max
+
+
+def _rotation_matrix(q):
+    """
+    :param q: sdfbuilder Quaternion
+    :return: 3x3 rotation matrix
+    """
+    w, x, y, z = q.real, q.x, q.y, q.z
+    return np.array([
+        [1 - 2 * (y * y + z * z), 2 * (x * y - z * w), 2 * (x * z + y * w)],
+        [2 * (x * y + z * w), 1 - 2 * (x * x + z * z), 2 * (y * z - x * w)],
+        [2 * (x * z - y * w), 2 * (y * z + x * w), 1 - 2 * (x * x + y * y)]
+    ])
+
+
+def _half_extents(geometry):
+    """
+    Returns the half extents of the box containing the given geometry,
+    or `None` for geometries that cannot be handled.
+    """
+    if hasattr(geometry, 'size'):
+        return 0.5 * np.array(geometry.size, dtype=float)
+    elif hasattr(geometry, 'length') and hasattr(geometry, 'radius'):
+        return np.array([geometry.radius, geometry.radius, 0.5 * geometry.length])
+    elif hasattr(geometry, 'radius'):
+        return np.array([geometry.radius] * 3, dtype=float)
+
+    return None
+
+
+def _collect_boxes(element, rot, pos, boxes):
+    """
+    Recursively collects the oriented boxes of all collisions in the
+    given element, given the element's rotation / position in the model frame.
+    """
+    children = list(getattr(element, 'elements', []))
+    collision = getattr(element, 'collision', None)
+    if collision is not None and collision not in children:
+        children.append(collision)
+
+    for child in children:
+        if hasattr(child, 'get_rotation'):
+            p = child.get_position()
+            c_rot = rot.dot(_rotation_matrix(child.get_rotation()))
+            c_pos = pos + rot.dot([p.x, p.y, p.z])
+        else:
+            c_rot, c_pos = rot, pos
+
+        if isinstance(child, Collision):
+            extents = _half_extents(child.geometry)
+            if extents is not None:
+                boxes.append((c_pos, c_rot.T, extents))
+
+        _collect_boxes(child, c_rot, c_pos, boxes)
+
+
+def get_boxes(model):
+    """
+    Returns the oriented collision boxes of the given SDF model.
+
+    :param model:
+    :return: Tuple `(centers, axes, extents, links, pairs)`, with
+             `centers` (n x 3), the box `axes` as rows (n x 3 x 3),
+             half `extents` (n x 3), the link index of each box and
+             the set of link index pairs connected by a joint.
+    """
+    links = model.get_elements_of_type(Link)
+    link_index = {link.name: i for i, link in enumerate(links)}
+
+    centers, axes, extents, owners = [], [], [], []
+    for i, link in enumerate(links):
+        p = link.get_position()
+        boxes = []
+        _collect_boxes(link, _rotation_matrix(link.get_rotation()), np.array([p.x, p.y, p.z]), boxes)
+        for c, a, e in boxes:
+            centers.append(c)
+            axes.append(a)
+            extents.append(e)
+            owners.append(i)
+
+    connected = set()
+    for joint in model.get_elements_of_type(Joint):
+        a = link_index.get(getattr(joint.parent, 'name', joint.parent))
+        b = link_index.get(getattr(joint.child, 'name', joint.child))
+        if a is not None and b is not None:
+            connected.add((min(a, b), max(a, b)))
+
+    return (np.array(centers).reshape(-1, 3), np.array(axes).reshape(-1, 3, 3),
+            np.array(extents).reshape(-1, 3), np.array(owners, dtype=int), connected)
+
+
+def candidate_pairs(centers, axes, extents, owners, connected):
+    """
+    Broad phase: returns the index pairs of boxes whose axis aligned
+    bounding boxes overlap and that are allowed to collide.
+    """
+    # Half extents of the axis aligned box around each oriented box
+    aabb = np.einsum('nkd,nk->nd', np.abs(axes), extents)
+    lo, hi = centers - aabb, centers + aabb
+
+    overlap = np.all((lo[:, None, :] < hi[None, :, :]) & (lo[None, :, :] < hi[:, None, :]), axis=2)
+    i, j = np.nonzero(np.triu(overlap, k=1))
+
+    keep = owners[i] != owners[j]
+    keep &= np.array([(min(a, b), max(a, b)) not in connected
+                      for a, b in itertools.izip(owners[i], owners[j])], dtype=bool)
+    return i[keep], j[keep]
+
+
+def boxes_intersect(centers, axes, extents, i, j):
+    """
+    Narrow phase: vectorized separating axis test for the box pairs
+    given by the index arrays `i` and `j`.
+    :return: Boolean array with one entry per pair
+    """
+    if not len(i):
+        return np.zeros(0, dtype=bool)
+
+    a, b = axes[i], axes[j]
+    ea, eb = extents[i], extents[j]
+    d = centers[j] - centers[i]
+
+    # The 15 candidate axes: 3 face normals of each box and
+    # the 9 cross products of their edges.
+    cross = np.cross(a[:, :, None, :], b[:, None, :, :]).reshape(-1, 9, 3)
+    test = np.concatenate([a, b, cross], axis=1)
+    norm = np.linalg.norm(test, axis=2)
+
+    # Parallel edges give degenerate cross products, which
+    # can never be separating axes.
+    valid = norm > 1e-9
+    test = test / np.where(valid, norm, 1.0)[:, :, None]
+
+    ra = np.einsum('mtk,mk->mt', np.abs(np.einsum('mtd,mkd->mtk', test, a)), ea)
+    rb = np.einsum('mtk,mk->mt', np.abs(np.einsum('mtd,mkd->mtk', test, b)), eb)
+    dist = np.abs(np.einsum('mtd,md->mt', test, d))
+
+    separated = valid & (dist > ra + rb)
+    return ~np.any(separated, axis=1)
+
+
+class LocalBodyAnalyzer(object):
+    """
+    Body analyzer that runs in the manager process.
+    """
+
+    def __init__(self, builder, conf, tolerance=CONTACT_TOLERANCE):
+        """
+        :param builder: Robot builder used to create the SDF model
+        :param conf:
+        :param tolerance: See `CONTACT_TOLERANCE`
+        :return:
+        """
+        self.builder = builder
+        self.conf = conf
+        self.tolerance = tolerance
+
+    def analyze_tree(self, tree):
+        """
+        :param tree:
+        :type tree: Tree
+        :return: Tuple `(intersects, bbox)`, as returned by `World.analyze_tree`
+        """
+        return self.analyze_robot(tree.to_robot())
+
+    def analyze_robot(self, robot):
+        """
+        :param robot: Protobuf robot
+        :return: Tuple `(intersects, bbox)`
+        """
+        sdf = get_simulation_robot(robot, "analyze_bot", self.builder, self.conf)
+        return self.analyze_model(sdf.elements[0])
+
+    def analyze_model(self, model):
+        """
+        :param model: SDF model
+        :return: Tuple `(intersects, bbox)`
+        """
+        centers, axes, extents, owners, connected = get_boxes(model)
+        if not len(centers):
+            return False, BoundingBox(Vector3(), Vector3())
+
+        # Bounding box over all box corners
+        signs = np.array(list(itertools.product((-1, 1), repeat=3)))
+        corners = centers[:, None, :] + np.einsum('ck,nk,nkd->ncd', signs, extents, axes)
+        lo, hi = corners.reshape(-1, 3).min(axis=0), corners.reshape(-1, 3).max(axis=0)
+        bbox = BoundingBox(Vector3(*lo), Vector3(*hi))
+
+        shrunk = np.maximum(extents - self.tolerance, 0.0)
+        i, j = candidate_pairs(centers, axes, shrunk, owners, connected)
+        intersects = bool(np.any(boxes_intersect(centers, axes, shrunk, i, j)))
+        return intersects, bbox
@@ -0,0 +1,135 @@
+"""
+Opt-in profiling of world manager methods and coroutines. Methods are
+wrapped on the instance, so nothing changes when profiling is off.
+
+For every call path the profiler records the self time (spent running
+the method's own code) and, for coroutines, the awaited time (spent
+suspended at a `yield`). The parent of a call is the profiled method
+that was running when it was called, also when the coroutine is
+scheduled as a separate task.
+"""
+from __future__ import absolute_import
+import functools
+import inspect
+import sys
+import time
+from collections import defaultdict
+
+
+class Profiler(object):
+    """
+    Collects self and awaited time per call path.
+    """
+
+    def __init__(self, clock=time.time):
+        """
+        :param clock: Function returning the current time in seconds
+        :return:
+        """
+        self.clock = clock
+        self.self_time = defaultdict(float)
+        self.await_time = defaultdict(float)
+        self.calls = defaultdict(int)
+
+        # Running code segments as [path, time spent in child segments]
+        self._stack = []
+
+    def _enter(self, path):
+        self._stack.append([path, 0.0])
+        return self.clock()
+
+    def _exit(self, start):
+        path, child_time = self._stack.pop()
+        elapsed = self.clock() - start
+        self.self_time[path] += elapsed - child_time
+        if self._stack:
+            self._stack[-1][1] += elapsed
+
+    def instrument(self, obj, names):
+        """
+        Replaces the given methods of `obj` by profiled versions.
+        :param obj:
+        :param names: Method names
+        :return:
+        """
+        for name in names:
+            setattr(obj, name, self.wrap(name, getattr(obj, name)))
+
+    def wrap(self, name, fn):
+        """
+        :param name: Name of the function in the call paths
+        :param fn: Function or coroutine function
+        :return: Profiled function
+        """
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            path = (self._stack[-1][0] if self._stack else ()) + (name,)
+            self.calls[path] += 1
+
+            start = self._enter(path)
+            try:
+                result = fn(*args, **kwargs)
+            finally:
+                self._exit(start)
+
+            return self._generator(path, result) if inspect.isgenerator(result) else result
+
+        wrapper._is_coroutine = getattr(fn, '_is_coroutine', False)
+        return wrapper
+
+    def _generator(self, path, gen):
+        """
+        Drives a coroutine generator, timing every step.
+        """
+        value, exc = None, None
+        try:
+            while True:
+                start = self._enter(path)
+                try:
+                    item = gen.send(value) if exc is None else gen.throw(*exc)
+                finally:
+                    self._exit(start)
+
+                suspended = self.clock()
+                try:
+                    value, exc = (yield item), None
+                except Exception as e:
+                    value, exc = None, (type(e), e, sys.exc_info()[2])
+
+                self.await_time[path] += self.clock() - suspended
+        finally:
+            gen.close()
+
+    def collapsed(self):
+        """
+        :return: Lines in the collapsed stack format used by flame graph
+                 tools, with times in microseconds. Awaited time is
+                 reported in an `[await]` frame below its coroutine.
+        """
+        lines = []
+        for path, t in sorted(self.self_time.items()):
+            lines.append("%s %d" % (';'.join(path), int(round(t * 1e6))))
+
+        for path, t in sorted(self.await_time.items()):
+            lines.append("%s;[await] %d" % (';'.join(path), int(round(t * 1e6))))
+
+        return lines
+
+    def dump(self, filename):
+        """
+        Writes the collapsed stacks to a file.
+        :param filename:
+        :return:
+        """
+        with open(filename, 'w') as f:
+            for line in self.collapsed():
+                f.write(line + '\n')
+
+    def summary(self):
+        """
+        :return: List of (path, calls, self time, awaited time) tuples,
+                 sorted by self time.
+        """
+        paths = set(self.self_time) | set(self.await_time)
+        rows = [(';'.join(p), self.calls[p], self.self_time[p], self.await_time[p]) for p in paths]
+        return sorted(rows, key=lambda r: -r[2])
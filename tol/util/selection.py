@@ -0,0 +1,53 @@
+"""
+Parent selection through k-tournaments over an array of fitness values.
+"""
+from __future__ import absolute_import
+import numpy as np
+
+
+def tournament(fitness, tournament_size, n, exclude=None, rng=np.random):
+    """
+    Runs `n` independent tournaments. Each tournament samples
+    `tournament_size` distinct individuals and picks the fittest.
+
+    :param fitness: Array of fitness values, one per individual
+    :param tournament_size:
+    :param n: Number of tournaments
+    :param exclude: Optional array of `n` indices, the individual at
+                    `exclude[i]` cannot take part in tournament `i`.
+    :param rng: Random state
+    :return: Array with the index of the winner of each tournament
+    """
+    fitness = np.asarray(fitness, dtype=float)
+    total = len(fitness)
+    available = total if exclude is None else total - 1
+    k = min(tournament_size, available)
+    if k < 1:
+        raise ValueError("Not enough individuals for a tournament.")
+
+    rows = np.arange(n)
+
+    # Sampling without replacement: the k individuals with
+    # the smallest random keys enter the tournament.
+    keys = rng.random_sample((n, total))
+    if exclude is not None:
+        keys[rows, exclude] = np.inf
+
+    candidates = np.argsort(keys, axis=1)[:, :k]
+    return candidates[rows, np.argmax(fitness[candidates], axis=1)]
+
+
+def select_pairs(fitness, tournament_size, n, rng=np.random):
+    """
+    Selects `n` parent pairs, each consisting of two distinct
+    tournament winners.
+
+    :param fitness: Array of fitness values, one per individual
+    :param tournament_size:
+    :param n: Number of pairs
+    :param rng: Random state
+    :return: n x 2 array of parent indices
+    """
+    first = tournament(fitness, tournament_size, n, rng=rng)
+    second = tournament(fitness, tournament_size, n, exclude=first, rng=rng)
+    return np.column_stack((first, second))
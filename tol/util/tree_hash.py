@@ -0,0 +1,81 @@
+"""
+Canonical structural hashes of robot trees. Two trees that describe
+the same robot get the same hash regardless of the IDs that were
+assigned to their parts and neurons, or the order in which children
+were added.
+"""
+import hashlib
+
+
+def _format_value(value):
+    return repr(float(value))
+
+
+def _part_key(part, indices):
+    """
+    Returns a canonical string for the subtree starting at the given
+    body part protobuf message, recording the canonical index of every
+    part id in `indices`.
+    :param part:
+    :param indices: Dictionary that is filled with part id => index
+    :type indices: dict
+    :return:
+    """
+    indices[part.id] = len(indices)
+    params = ",".join(_format_value(p.value) for p in part.param)
+    children = sorted(part.child, key=lambda c: (c.src, c.dst))
+    sub = ";".join("%d>%d:%s" % (c.src, c.dst, _part_key(c.part, indices))
+                   for c in children)
+    return "%s|%s|%s[%s]" % (part.type, _format_value(part.orientation), params, sub)
+
+
+def _brain_key(brain, indices):
+    """
+    Returns a canonical string for a neural network protobuf message, with
+    neurons identified by the canonical index of the part they belong to.
+    :param brain:
+    :param indices: Part id => canonical index, as produced by `_part_key`
+    :return:
+    """
+    def neuron_sort_key(n):
+        suffix = n.id[len(n.partId):] if n.partId and n.id.startswith(n.partId) else n.id
+        return indices.get(n.partId, -1), n.layer, n.type, suffix
+
+    neurons = sorted(brain.neuron, key=neuron_sort_key)
+    names = {n.id: "%d:%d" % (indices.get(n.partId, -1), i) for i, n in enumerate(neurons)}
+
+    neuron_keys = ["%s|%s|%s|%s" % (names[n.id], n.layer, n.type,
+                                    ",".join(_format_value(p.value) for p in n.param))
+                   for n in neurons]
+    conn_keys = sorted("%s>%s:%s" % (names.get(c.src, c.src), names.get(c.dst, c.dst),
+                                     _format_value(c.weight))
+                       for c in brain.connection)
+    return "%s#%s" % (";".join(neuron_keys), ";".join(conn_keys))
+
+
+def body_hash(tree):
+    """
+    Returns a canonical hash of the body of the given tree, which
+    is all that matters for body analysis.
+    :param tree:
+    :type tree: Tree
+    :return:
+    :rtype: str
+    """
+    robot = tree.to_robot()
+    return hashlib.sha1(_part_key(robot.body.root, {})).hexdigest()
+
+
+def genotype_hash(tree):
+    """
+    Returns a canonical hash of both the body and the brain
+    of the given tree.
+    :param tree:
+    :type tree: Tree
+    :return:
+    :rtype: str
+    """
+    robot = tree.to_robot()
+    indices = {}
+    key = _part_key(robot.body.root, indices) + "#" + _brain_key(robot.brain, indices)
+    return hashlib.sha1(key).hexdigest()